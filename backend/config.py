@@ -12,6 +12,7 @@ LLM_MODEL_VISION = "claude-sonnet-4-5-20250929"
 LLM_MODEL_PACKING_LIST = "claude-sonnet-4-5-20250929"
 LLM_MAX_TOKENS_INVOICE = 8192
 LLM_MAX_TOKENS_PACKING_LIST = 64000
+LLM_NORMALIZE_MAX_CONCURRENCY = int(os.getenv("LLM_NORMALIZE_MAX_CONCURRENCY", "4"))
 
 # Database (PostgreSQL on Railway)
 DATABASE_URL = os.getenv("DATABASE_URL", "")
@@ -27,6 +28,7 @@ S3_REGION = os.getenv("S3_REGION", "us-east-1")
 GAIA_API_URL = os.getenv("GAIA_API_URL", "https://platform-api.gaiadynamics.ai")
 GAIA_API_KEY = os.getenv("GAIA_API_KEY", "")
 GAIA_TIMEOUT_SECONDS = int(os.getenv("GAIA_TIMEOUT_SECONDS", "30"))
+GAIA_MAX_CONCURRENCY = int(os.getenv("GAIA_MAX_CONCURRENCY", "24"))
 
 # Xindus B2B API (Phase 3)
 XINDUS_API_URL = os.getenv("XINDUS_API_URL", "")
@@ -12,6 +12,7 @@ from typing import Any
 from uuid import UUID
 
 import asyncpg
+import orjson
 
 logger = logging.getLogger(__name__)
 
@@ -162,7 +163,19 @@ DO $$ BEGIN
   ALTER TABLE gaia_classifications ADD COLUMN llm_normalized TEXT;
 EXCEPTION WHEN duplicate_column THEN NULL; END $$;
 
+-- Persist derived tariff fields so cache hits skip recomputation (idempotent)
+DO $$ BEGIN
+  ALTER TABLE gaia_classifications ADD COLUMN base_duty_rate FLOAT;
+EXCEPTION WHEN duplicate_column THEN NULL; END $$;
+DO $$ BEGIN
+  ALTER TABLE gaia_classifications ADD COLUMN tariff_scenarios JSONB;
+EXCEPTION WHEN duplicate_column THEN NULL; END $$;
+DO $$ BEGIN
+  ALTER TABLE gaia_classifications ADD COLUMN remedy_flags JSONB;
+EXCEPTION WHEN duplicate_column THEN NULL; END $$;
+
 -- Clear Gaia cache: re-classify with LLM normalization for better accuracy.
+-- Also drops rows keyed with the old "{desc}|{dest}|{origin}" hash layout.
 TRUNCATE gaia_classifications;
 
 -- Xindus customer linking (idempotent)
@@ -272,7 +285,11 @@ async def _backfill_seller_ids() -> None:
             if not shipper_name:
                 continue
 
-            seller_id, _ = await match_or_create_seller(shipper_name, shipper_addr)
+            # No Xindus auto-link here: it would start one LLM/search task
+            # per seller during startup. Sellers link on their next match.
+            seller_id, _ = await match_or_create_seller(
+                shipper_name, shipper_addr, link_xindus=False,
+            )
             await pool.execute(
                 "UPDATE draft_shipments SET seller_id = $1 WHERE id = $2",
                 seller_id,
@@ -610,34 +627,43 @@ async def create_correction(
     return row["id"]
 
 
-async def get_corrections_for_field(
-    field_path: str,
-    limit: int = 5,
+async def get_corrections_for_fields(
+    field_paths: list[str],
+    limit_per: int = 2,
     seller_id: UUID | None = None,
-) -> list[dict[str, Any]]:
+) -> dict[str, list[dict[str, Any]]]:
+    """Fetch the latest corrections for several fields in one query.
+
+    Returns a dict keyed by field_path, each holding up to ``limit_per``
+    rows (field_path, original_value, corrected_value, file_context),
+    newest first.
+    """
+    if not field_paths:
+        return {}
     pool = get_pool()
+    seller_filter = "AND seller_id = $3" if seller_id is not None else ""
+    args: list[Any] = [list(set(field_paths)), limit_per]
     if seller_id is not None:
-        rows = await pool.fetch(
-            """SELECT field_path, original_value, corrected_value, file_context
-               FROM corrections
-               WHERE field_path = $1 AND seller_id = $3
-               ORDER BY created_at DESC
-               LIMIT $2""",
-            field_path,
-            limit,
-            seller_id,
-        )
-    else:
-        rows = await pool.fetch(
-            """SELECT field_path, original_value, corrected_value, file_context
-               FROM corrections
-               WHERE field_path = $1
-               ORDER BY created_at DESC
-               LIMIT $2""",
-            field_path,
-            limit,
-        )
-    return [dict(r) for r in rows]
+        args.append(seller_id)
+    rows = await pool.fetch(
+        f"""SELECT field_path, original_value, corrected_value, file_context
+           FROM (
+             SELECT field_path, original_value, corrected_value, file_context,
+                    created_at,
+                    ROW_NUMBER() OVER (
+                      PARTITION BY field_path ORDER BY created_at DESC
+                    ) AS rn
+             FROM corrections
+             WHERE field_path = ANY($1) {seller_filter}
+           ) ranked
+           WHERE rn <= $2
+           ORDER BY field_path, created_at DESC""",
+        *args,
+    )
+    result: dict[str, list[dict[str, Any]]] = {}
+    for r in rows:
+        result.setdefault(r["field_path"], []).append(dict(r))
+    return result
 
 
 async def get_corrections_for_draft(draft_id: UUID) -> list[dict[str, Any]]:
@@ -830,6 +856,25 @@ async def update_seller_xindus_customer_id(
     )
 
 
+async def link_seller_xindus_customer_if_unset(
+    seller_id: UUID, xindus_customer_id: int
+) -> bool:
+    """Link a seller to a Xindus customer unless it is already linked.
+
+    Used by the auto-link, so a manual link set while it was matching is
+    never overwritten. Returns True if the row was updated.
+    """
+    pool = get_pool()
+    row_id = await pool.fetchval(
+        """UPDATE sellers
+           SET xindus_customer_id = $1, updated_at = NOW()
+           WHERE id = $2 AND xindus_customer_id IS NULL
+           RETURNING id""",
+        xindus_customer_id, seller_id,
+    )
+    return row_id is not None
+
+
 async def increment_seller_shipment_count(seller_id: UUID) -> None:
     pool = get_pool()
     await pool.execute(
@@ -1005,13 +1050,16 @@ async def get_gaia_classifications_batch(
 ) -> dict[str, dict[str, Any]]:
     """Batch cache lookup: fetch all matching Gaia classifications in one query.
 
-    Returns a dict keyed by description_hash for O(1) lookups.
+    Returns a dict keyed by description_hash for O(1) lookups. Only the
+    columns a cache hit applies are selected; the raw response JSONB is not.
     """
     if not desc_hashes:
         return {}
     pool = get_pool()
     rows = await pool.fetch(
-        """SELECT * FROM gaia_classifications
+        """SELECT description_hash, ehsn, ihsn, duty_rate, base_duty_rate,
+                  confidence, tariff_scenarios, remedy_flags
+           FROM gaia_classifications
            WHERE description_hash = ANY($1)
              AND destination_country = $2
              AND origin_country = $3""",
@@ -1022,7 +1070,29 @@ async def get_gaia_classifications_batch(
     return {row["description_hash"]: dict(row) for row in rows}
 
 
-async def upsert_gaia_classification(
+_UPSERT_GAIA_SQL = """INSERT INTO gaia_classifications
+     (description_hash, normalized_description, destination_country,
+      origin_country, ehsn, ihsn, duty_rate, confidence,
+      classification_response, tariff_response, llm_normalized,
+      base_duty_rate, tariff_scenarios, remedy_flags)
+   VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9::jsonb, $10::jsonb, $11,
+           $12, $13::jsonb, $14::jsonb)
+   ON CONFLICT (description_hash, destination_country, origin_country)
+   DO UPDATE SET
+     ehsn = EXCLUDED.ehsn,
+     ihsn = EXCLUDED.ihsn,
+     duty_rate = EXCLUDED.duty_rate,
+     confidence = EXCLUDED.confidence,
+     classification_response = EXCLUDED.classification_response,
+     tariff_response = EXCLUDED.tariff_response,
+     llm_normalized = EXCLUDED.llm_normalized,
+     base_duty_rate = EXCLUDED.base_duty_rate,
+     tariff_scenarios = EXCLUDED.tariff_scenarios,
+     remedy_flags = EXCLUDED.remedy_flags,
+     created_at = NOW()"""
+
+
+def _gaia_upsert_args(
     desc_hash: str,
     normalized_description: str,
     destination: str,
@@ -1034,25 +1104,12 @@ async def upsert_gaia_classification(
     classification_response: dict[str, Any] | None,
     tariff_response: dict[str, Any] | None,
     llm_normalized: str | None = None,
-) -> None:
-    """Store or update a Gaia classification result in cache."""
-    pool = get_pool()
-    await pool.execute(
-        """INSERT INTO gaia_classifications
-             (description_hash, normalized_description, destination_country,
-              origin_country, ehsn, ihsn, duty_rate, confidence,
-              classification_response, tariff_response, llm_normalized)
-           VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9::jsonb, $10::jsonb, $11)
-           ON CONFLICT (description_hash, destination_country, origin_country)
-           DO UPDATE SET
-             ehsn = EXCLUDED.ehsn,
-             ihsn = EXCLUDED.ihsn,
-             duty_rate = EXCLUDED.duty_rate,
-             confidence = EXCLUDED.confidence,
-             classification_response = EXCLUDED.classification_response,
-             tariff_response = EXCLUDED.tariff_response,
-             llm_normalized = EXCLUDED.llm_normalized,
-             created_at = NOW()""",
+    base_duty_rate: float | None = None,
+    tariff_scenarios: list[dict[str, Any]] | None = None,
+    remedy_flags: dict[str, bool] | None = None,
+) -> tuple[Any, ...]:
+    """Positional arguments for ``_UPSERT_GAIA_SQL``."""
+    return (
         desc_hash,
         normalized_description,
         destination,
@@ -1061,9 +1118,26 @@ async def upsert_gaia_classification(
         ihsn,
         duty_rate,
         confidence,
-        json.dumps(classification_response) if classification_response else None,
-        json.dumps(tariff_response) if tariff_response else None,
+        orjson.dumps(classification_response).decode() if classification_response else None,
+        orjson.dumps(tariff_response).decode() if tariff_response else None,
         llm_normalized,
+        base_duty_rate,
+        orjson.dumps(tariff_scenarios).decode() if tariff_scenarios else None,
+        orjson.dumps(remedy_flags).decode() if remedy_flags else None,
+    )
+
+
+async def upsert_gaia_classifications_batch(rows: list[dict[str, Any]]) -> None:
+    """Store or update many Gaia classification results in one round trip.
+
+    Each row holds the keyword arguments of ``_gaia_upsert_args``.
+    """
+    if not rows:
+        return
+    pool = get_pool()
+    await pool.executemany(
+        _UPSERT_GAIA_SQL,
+        [_gaia_upsert_args(**row) for row in rows],
     )
 
 
@@ -37,7 +37,8 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     """Application lifespan handler.
 
     * On startup: ensure the output directory tree exists.
-    * On shutdown: (no-op for now; add cleanup here if needed.)
+    * On shutdown: cancel background seller auto-links, then close the
+      database pool and shared HTTP clients.
     """
     # Startup
     os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -55,11 +56,32 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
 
     yield
 
-    # Shutdown
+    # Shutdown: stop background seller auto-links before the pool closes
+    from backend.services.seller_intelligence import cancel_link_tasks
+
+    try:
+        await cancel_link_tasks()
+    except Exception:
+        logger.warning("Seller auto-link cancellation failed", exc_info=True)
+
     try:
         await close_db()
     except Exception:
         logger.warning("Database close failed", exc_info=True)
+
+    from backend.services.gaia_client import close_http
+
+    try:
+        await close_http()
+    except Exception:
+        logger.warning("Gaia HTTP client close failed", exc_info=True)
+
+    from backend.services.metabase import close_http as close_metabase_http
+
+    try:
+        await close_metabase_http()
+    except Exception:
+        logger.warning("Metabase HTTP client close failed", exc_info=True)
     logger.info("B2B Sheet Generator service shutting down.")
 
 
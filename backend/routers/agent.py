@@ -641,6 +641,8 @@ async def get_draft(draft_id: UUID):
 @router.patch("/drafts/{draft_id}", response_model=DraftDetail)
 async def apply_corrections(draft_id: UUID, body: CorrectionRequest):
     """Apply field corrections to a draft shipment."""
+    from backend.services.learning import invalidate_hint_cache
+
     draft = await db.get_draft(draft_id)
     if not draft:
         raise HTTPException(404, "Draft not found")
@@ -694,6 +696,8 @@ async def apply_corrections(draft_id: UUID, body: CorrectionRequest):
 
     # Save updated data
     await db.update_draft_corrections(draft_id, current_data)
+    # New corrections must show up in the next extraction's hints
+    invalidate_hint_cache()
 
     return await get_draft(draft_id)
 
@@ -1593,7 +1597,8 @@ async def match_seller(name: str):
     if not name.strip():
         raise HTTPException(400, "name parameter required")
 
-    seller_id, _ = await match_or_create_seller(name)
+    # Await the Xindus link: the response includes xindus_customer_id
+    seller_id, _ = await match_or_create_seller(name, link_in_background=False)
     seller_row = await db.get_seller(seller_id)
     if not seller_row:
         raise HTTPException(404, "Seller not found")
@@ -5,20 +5,18 @@ Classifies each uploaded PDF as one of:
 """
 from __future__ import annotations
 
-import asyncio
-import json
 import logging
 import re
-from functools import partial
 from typing import Any
 
 import anthropic
+import orjson
 
 from backend.config import ANTHROPIC_API_KEY, LLM_MODEL_TEXT, LLM_MODEL_VISION
 
 logger = logging.getLogger(__name__)
 
-_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+_client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
 
 DOCUMENT_TYPES = [
     "invoice",
@@ -49,11 +47,81 @@ Return ONLY a valid JSON object (no markdown fences, no commentary):
 """
 
 
-def _classify_sync(
+# Cheap first-pass classifier: weighted phrases that identify a document
+# type from its text. Titles carry most of the weight; supporting column
+# headers add a little. Only a clear winner skips the LLM call.
+_KEYWORD_SIGNATURES: dict[str, list[tuple[str, float]]] = {
+    "invoice": [
+        ("commercial invoice", 3.0),
+        ("tax invoice", 3.0),
+        ("export invoice", 3.0),
+        ("invoice no", 1.0),
+        ("unit price", 1.0),
+        ("amount in words", 1.0),
+    ],
+    "packing_list": [
+        ("packing list", 3.0),
+        ("packing slip", 3.0),
+        ("gross weight", 1.0),
+        ("net weight", 1.0),
+        ("carton no", 1.0),
+        ("dimensions", 1.0),
+    ],
+    "certificate": [
+        ("certificate of origin", 3.0),
+        ("phytosanitary", 3.0),
+        ("test report", 3.0),
+        ("hereby certif", 1.0),
+    ],
+    "bill_of_lading": [
+        ("bill of lading", 3.0),
+        ("airway bill", 3.0),
+        ("vessel", 1.0),
+        ("container no", 1.0),
+    ],
+    "purchase_order": [
+        ("purchase order", 3.0),
+        ("po date", 1.0),
+        ("delivery schedule", 1.0),
+    ],
+}
+_KEYWORD_MIN_SCORE = 3.0
+_KEYWORD_MIN_MARGIN = 3.0
+
+
+def _classify_by_keywords(pages_data: list[dict[str, Any]]) -> dict[str, Any] | None:
+    """Classify from the first 2 pages of text if one type clearly wins.
+
+    Returns None when the keyword scores are low or ambiguous (e.g. an
+    "invoice cum packing list"), so the caller falls back to the LLM.
+    """
+    text = " ".join(page.get("text", "") for page in pages_data[:2]).lower()
+    if not text.strip():
+        return None
+
+    scores: list[tuple[float, str, list[str]]] = []
+    for doc_type, signatures in _KEYWORD_SIGNATURES.items():
+        matched = [(phrase, weight) for phrase, weight in signatures if phrase in text]
+        score = sum(weight for _, weight in matched)
+        scores.append((score, doc_type, [phrase for phrase, _ in matched]))
+    scores.sort(key=lambda t: t[0], reverse=True)
+
+    top_score, top_type, top_hits = scores[0]
+    if top_score < _KEYWORD_MIN_SCORE or top_score - scores[1][0] < _KEYWORD_MIN_MARGIN:
+        return None
+
+    return {
+        "document_type": top_type,
+        "confidence": 0.9,
+        "reason": f"Keyword match: {', '.join(top_hits)}",
+    }
+
+
+async def _classify_async(
     pages_data: list[dict[str, Any]],
     is_vision: bool,
 ) -> dict[str, Any]:
-    """Synchronous classification call."""
+    """Classify via Claude."""
     if is_vision:
         import base64
         content: list[dict[str, Any]] = [
@@ -63,12 +131,15 @@ def _classify_sync(
         for page in pages_data[:2]:
             image_bytes = page.get("image_bytes")
             if image_bytes:
-                b64_data = base64.standard_b64encode(image_bytes).decode("ascii")
+                b64_data = (
+                    page.get("image_b64")
+                    or base64.standard_b64encode(image_bytes).decode("ascii")
+                )
                 content.append({
                     "type": "image",
                     "source": {
                         "type": "base64",
-                        "media_type": "image/png",
+                        "media_type": page.get("image_media_type", "image/png"),
                         "data": b64_data,
                     },
                 })
@@ -83,7 +154,7 @@ def _classify_sync(
         content = "Classify this document:\n\n" + "\n\n".join(text_parts)
         model = LLM_MODEL_TEXT
 
-    response = _client.messages.create(
+    response = await _client.messages.create(
         model=model,
         max_tokens=256,
         system=_CLASSIFICATION_PROMPT,
@@ -96,7 +167,7 @@ def _classify_sync(
     if fence_match:
         raw = fence_match.group(1).strip()
 
-    result = json.loads(raw)
+    result = orjson.loads(raw)
 
     # Validate document type
     doc_type = result.get("document_type", "other").lower()
@@ -121,12 +192,19 @@ async def classify_document(
     if not pages_data:
         return {"document_type": "other", "confidence": 0.0, "reason": "No pages"}
 
-    loop = asyncio.get_running_loop()
+    # Text documents with an unambiguous title don't need an LLM call
+    if not is_vision:
+        result = _classify_by_keywords(pages_data)
+        if result:
+            logger.info(
+                "Classified as %s by keywords: %s",
+                result["document_type"],
+                result["reason"][:80],
+            )
+            return result
+
     try:
-        result = await loop.run_in_executor(
-            None,
-            partial(_classify_sync, pages_data, is_vision),
-        )
+        result = await _classify_async(pages_data, is_vision)
         logger.info(
             "Classified as %s (confidence=%.2f): %s",
             result["document_type"],
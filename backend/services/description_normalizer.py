@@ -9,12 +9,14 @@ for Gaia classification. The regex result is always used as the cache key.
 """
 from __future__ import annotations
 
+import asyncio
 import logging
 import re
+from functools import lru_cache
 
 import anthropic
 
-from backend.config import ANTHROPIC_API_KEY, LLM_MODEL_TEXT
+from backend.config import ANTHROPIC_API_KEY, LLM_MODEL_TEXT, LLM_NORMALIZE_MAX_CONCURRENCY
 
 logger = logging.getLogger(__name__)
 
@@ -43,11 +45,13 @@ def _get_client() -> anthropic.AsyncAnthropic:
     return _client
 
 
+@lru_cache(maxsize=4096)
 def normalize_description(raw: str) -> str:
     """Clean a product description for classification caching (regex only).
 
     Strips quantities, prices, reference numbers, and special characters
-    to produce a stable key suitable for cache lookups.
+    to produce a stable key suitable for cache lookups. Memoized: the same
+    catalog descriptions recur across items and invoices.
     """
     if not raw:
         return ""
@@ -124,17 +128,46 @@ async def llm_normalize_description(raw: str) -> str | None:
         return None
 
 
+# Numbered-list output stays reliable up to about this many items per call
+_LLM_BATCH_SIZE = 20
+
+# Process-wide cap on in-flight chunk calls, so a large catalogue (or several
+# batches at once) doesn't fire every chunk at the API together and hit 429s.
+_LLM_SEM = asyncio.Semaphore(LLM_NORMALIZE_MAX_CONCURRENCY)
+
+
 async def llm_normalize_batch(descriptions: list[str]) -> dict[str, str]:
-    """Batch-normalize descriptions via Claude. One LLM call for up to ~20 items.
+    """Batch-normalize descriptions via Claude, one LLM call per ~20 unique items.
 
+    Duplicate descriptions are sent once; chunks are normalized concurrently,
+    at most LLM_NORMALIZE_MAX_CONCURRENCY at a time.
     Returns a mapping of raw_description → cleaned_description.
     Only includes successful normalizations.
     """
     if not descriptions or not ANTHROPIC_API_KEY:
         return {}
 
+    unique = list(dict.fromkeys(d.strip() for d in descriptions if d.strip()))
+    if not unique:
+        return {}
+
+    chunks = [unique[i:i + _LLM_BATCH_SIZE] for i in range(0, len(unique), _LLM_BATCH_SIZE)]
+    cleaned: dict[str, str] = {}
+    for chunk_result in await asyncio.gather(*(_llm_normalize_chunk(c) for c in chunks)):
+        cleaned.update(chunk_result)
+
+    result = {raw: cleaned[raw.strip()] for raw in descriptions if raw.strip() in cleaned}
+    logger.info(
+        "LLM batch normalize: %d/%d unique succeeded (%d inputs)",
+        len(cleaned), len(unique), len(descriptions),
+    )
+    return result
+
+
+async def _llm_normalize_chunk(descriptions: list[str]) -> dict[str, str]:
+    """Normalize one chunk of stripped, unique descriptions in a single LLM call."""
     # Build a numbered list for a single LLM call
-    numbered = "\n".join(f"{i+1}. {d.strip()}" for i, d in enumerate(descriptions))
+    numbered = "\n".join(f"{i+1}. {d}" for i, d in enumerate(descriptions))
     prompt = (
         f"Normalize each product description below. "
         f"Return one clean product name per line, numbered to match.\n\n{numbered}"
@@ -142,12 +175,13 @@ async def llm_normalize_batch(descriptions: list[str]) -> dict[str, str]:
 
     try:
         client = _get_client()
-        resp = await client.messages.create(
-            model=LLM_MODEL_TEXT,
-            max_tokens=1000,
-            system=_LLM_NORMALIZE_PROMPT,
-            messages=[{"role": "user", "content": prompt}],
-        )
+        async with _LLM_SEM:
+            resp = await client.messages.create(
+                model=LLM_MODEL_TEXT,
+                max_tokens=1000,
+                system=_LLM_NORMALIZE_PROMPT,
+                messages=[{"role": "user", "content": prompt}],
+            )
         text = resp.content[0].text.strip()
 
         # Parse numbered lines: "1. Clean Name" or "1: Clean Name"
@@ -163,9 +197,7 @@ async def llm_normalize_batch(descriptions: list[str]) -> dict[str, str]:
                 cleaned = m.group(2).strip()
                 if 0 <= idx < len(descriptions) and cleaned:
                     result[descriptions[idx]] = cleaned
-
-        logger.info("LLM batch normalize: %d/%d succeeded", len(result), len(descriptions))
         return result
     except Exception:
-        logger.warning("LLM batch normalize failed", exc_info=True)
+        logger.warning("LLM batch normalize failed for %d items", len(descriptions), exc_info=True)
         return {}
@@ -8,6 +8,7 @@ from __future__ import annotations
 
 import logging
 import re
+from functools import lru_cache
 from typing import Any
 
 logger = logging.getLogger(__name__)
@@ -18,11 +19,17 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------
 
 
+@lru_cache(maxsize=256)
+def _split_path(path: str) -> tuple[str, ...]:
+    """Split a dotted field path once; paths are a small fixed set of literals."""
+    return tuple(path.split("."))
+
+
 def _cv(data: Any, *paths: str) -> str | None:
     """Extract a value from nested dicts, handling ConfidenceValue wrappers."""
     for path in paths:
         obj = data
-        for key in path.split("."):
+        for key in _split_path(path):
             if not isinstance(obj, dict):
                 obj = None
                 break
@@ -33,8 +40,16 @@ def _cv(data: Any, *paths: str) -> str | None:
             val = obj["value"]
         else:
             val = obj
-        if val is not None and str(val).strip():
-            return str(val).strip()
+        if val is None:
+            continue
+        if isinstance(val, str):
+            # Extracted strings are usually already trimmed; avoid a copy
+            if val[:1].isspace() or val[-1:].isspace():
+                val = val.strip()
+        else:
+            val = str(val).strip()
+        if val:
+            return val
     return None
 
 
@@ -64,7 +79,7 @@ def _confidence(data: Any, *paths: str) -> float:
     """Extract the confidence score for a field."""
     for path in paths:
         obj = data
-        for key in path.split("."):
+        for key in _split_path(path):
             if not isinstance(obj, dict):
                 obj = None
                 break
@@ -97,41 +112,61 @@ _EMPTY_ADDRESS: dict[str, Any] = {
 }
 
 
+# Xindus address key → extracted field path(s), in lookup order
+_ADDRESS_FIELD_PATHS: tuple[tuple[str, tuple[str, ...]], ...] = (
+    ("name", ("name",)),
+    ("email", ("email",)),
+    ("phone", ("phone",)),
+    ("address", ("address",)),
+    ("city", ("city",)),
+    ("zip", ("zip_code", "zip")),
+    ("district", ("district",)),
+    ("state", ("state",)),
+    ("country", ("country",)),
+    ("extension_number", ("extension_number",)),
+    ("eori_number", ("eori_number",)),
+    ("contact_name", ("contact_name",)),
+    ("contact_phone", ("contact_phone",)),
+    ("warehouse_id", ("warehouse_id",)),
+    ("type", ("type",)),
+)
+
+
+# Address fields that carry a per-field confidence score (keyed by Xindus name)
+_ADDRESS_CONFIDENCE_KEYS = frozenset(
+    ("name", "address", "city", "state", "zip", "country", "phone", "email")
+)
+
+
 def _map_address(addr_data: dict[str, Any] | None) -> dict[str, Any]:
     """Map an extracted address to Xindus AddressRequestDTO format."""
-    if not addr_data or not isinstance(addr_data, dict):
-        return dict(_EMPTY_ADDRESS)
-    return {
-        "name": _cv(addr_data, "name") or "",
-        "email": _cv(addr_data, "email") or "",
-        "phone": _cv(addr_data, "phone") or "",
-        "address": _cv(addr_data, "address") or "",
-        "city": _cv(addr_data, "city") or "",
-        "zip": _cv(addr_data, "zip_code", "zip") or "",
-        "district": _cv(addr_data, "district") or "",
-        "state": _cv(addr_data, "state") or "",
-        "country": _cv(addr_data, "country") or "",
-        "extension_number": _cv(addr_data, "extension_number") or "",
-        "eori_number": _cv(addr_data, "eori_number") or "",
-        "contact_name": _cv(addr_data, "contact_name") or "",
-        "contact_phone": _cv(addr_data, "contact_phone") or "",
-        "warehouse_id": _cv(addr_data, "warehouse_id") or None,
-        "type": _cv(addr_data, "type") or None,
-    }
+    return _map_address_with_conf(addr_data)[0]
 
 
-def _address_confidence(addr_data: dict[str, Any] | None) -> dict[str, float]:
-    """Get per-field confidence for an address."""
+def _map_address_with_conf(
+    addr_data: dict[str, Any] | None,
+) -> tuple[dict[str, Any], dict[str, float]]:
+    """Map an extracted address and collect per-field confidence in one pass.
+
+    Returns (AddressRequestDTO dict, {field: confidence}); confidences of 0
+    are omitted. The zip confidence comes from the extracted ``zip_code``.
+    """
+    address = _EMPTY_ADDRESS.copy()
+    scores: dict[str, float] = {}
     if not addr_data or not isinstance(addr_data, dict):
-        return {}
-    scores = {}
-    for field in ["name", "address", "city", "state", "zip_code", "country", "phone", "email"]:
-        c = _confidence(addr_data, field)
-        if c > 0:
-            # Map zip_code confidence key to "zip" for new format
-            key = "zip" if field == "zip_code" else field
-            scores[key] = c
-    return scores
+        return address, scores
+    # Only overwrite the template where the extraction has a value
+    for key, paths in _ADDRESS_FIELD_PATHS:
+        val = _cv(addr_data, *paths)
+        if val is not None:
+            address[key] = val
+        if key in _ADDRESS_CONFIDENCE_KEYS:
+            obj = addr_data.get(paths[0])
+            if isinstance(obj, dict) and "confidence" in obj:
+                c = float(obj["confidence"])
+                if c > 0:
+                    scores[key] = c
+    return address, scores
 
 
 # ---------------------------------------------------------------------------
@@ -160,10 +195,15 @@ def _map_boxes(
             did = did.get("value", "")
         dest_map[str(did)] = d
 
+    # Lowercase + tokenize each line item description once, not per box item
+    li_index = _index_line_items(line_items)
+    # Inherited fields per matched line item, keyed by id(line_item)
+    li_fields_cache: dict[int, dict[str, Any]] = {}
+
     for box in boxes:
         dest_id = _cv(box, "destination_id") or ""
         dest = dest_map.get(dest_id, {})
-        receiver = _map_address(dest) if dest else dict(_EMPTY_ADDRESS)
+        receiver = _map_address(dest) if dest else _EMPTY_ADDRESS.copy()
 
         # Map box items → Xindus ShipmentBoxItemRequestDTO
         items = []
@@ -172,23 +212,30 @@ def _map_boxes(
             qty = _cv_int(bi, "quantity") or 0
 
             # Try to find matching line item for price/HS code
-            matched_li = _find_matching_line_item(desc, line_items)
+            matched_li = _find_matching_line_item(desc, li_index)
+            if matched_li is None:
+                li_fields = _NO_LINE_ITEM_FIELDS
+            else:
+                li_fields = li_fields_cache.get(id(matched_li))
+                if li_fields is None:
+                    li_fields = _line_item_fields(matched_li)
+                    li_fields_cache[id(matched_li)] = li_fields
 
             items.append({
                 "description": desc,
                 "quantity": qty,
-                "weight": _cv_float(matched_li, "unit_weight_kg") if matched_li else None,
-                "unit_price": _cv_float(matched_li, "unit_price_usd") if matched_li else None,
-                "total_price": _cv_float(matched_li, "total_price_usd") if matched_li else None,
-                "ehsn": _cv(matched_li, "hs_code_origin") if matched_li else "",
-                "ihsn": _cv(matched_li, "hs_code_destination") if matched_li else "",
-                "country_of_origin": _cv(matched_li, "country_of_origin") or "IN",
+                "weight": li_fields["weight"],
+                "unit_price": li_fields["unit_price"],
+                "total_price": li_fields["total_price"],
+                "ehsn": li_fields["ehsn"],
+                "ihsn": li_fields["ihsn"],
+                "country_of_origin": li_fields["country_of_origin"],
                 "category": "",
                 "market_place": "",
-                "igst_amount": _cv_float(matched_li, "igst_percent") if matched_li else None,
-                "duty_rate": _cv_float(matched_li, "duty_rate") if matched_li else None,
+                "igst_amount": li_fields["igst_amount"],
+                "duty_rate": li_fields["duty_rate"],
                 "vat_rate": None,
-                "unit_fob_value": _cv_float(matched_li, "unit_fob_value") if matched_li else None,
+                "unit_fob_value": li_fields["unit_fob_value"],
                 "fob_value": None,
                 "listing_price": None,
                 "cogs_value": None,
@@ -212,40 +259,81 @@ def _map_boxes(
     return boxes_out
 
 
+# Box item fields inherited from the matched invoice line item
+_NO_LINE_ITEM_FIELDS: dict[str, Any] = {
+    "weight": None,
+    "unit_price": None,
+    "total_price": None,
+    "ehsn": "",
+    "ihsn": "",
+    "country_of_origin": "IN",
+    "igst_amount": None,
+    "duty_rate": None,
+    "unit_fob_value": None,
+}
+
+
+def _line_item_fields(li: dict[str, Any]) -> dict[str, Any]:
+    """Extract the fields a box item inherits from its matched line item."""
+    return {
+        "weight": _cv_float(li, "unit_weight_kg"),
+        "unit_price": _cv_float(li, "unit_price_usd"),
+        "total_price": _cv_float(li, "total_price_usd"),
+        "ehsn": _cv(li, "hs_code_origin"),
+        "ihsn": _cv(li, "hs_code_destination"),
+        "country_of_origin": _cv(li, "country_of_origin") or "IN",
+        "igst_amount": _cv_float(li, "igst_percent"),
+        "duty_rate": _cv_float(li, "duty_rate"),
+        "unit_fob_value": _cv_float(li, "unit_fob_value"),
+    }
+
+
+def _index_line_items(
+    line_items: list[dict[str, Any]],
+) -> list[tuple[dict[str, Any], str, set[str]]]:
+    """Precompute (line_item, lowercased description, word set) for matching."""
+    index = []
+    for li in line_items:
+        li_lower = (_cv(li, "description") or "").lower()
+        if li_lower:
+            index.append((li, li_lower, set(li_lower.split())))
+    return index
+
+
 def _find_matching_line_item(
     description: str,
-    line_items: list[dict[str, Any]],
+    li_index: list[tuple[dict[str, Any], str, set[str]]],
 ) -> dict[str, Any] | None:
-    """Find the best matching invoice line item by description similarity."""
-    if not description or not line_items:
+    """Find the best matching invoice line item by description similarity.
+
+    ``li_index`` is the output of ``_index_line_items``.
+    """
+    if not description or not li_index:
         return None
 
     desc_lower = description.lower()
+    words_a = set(desc_lower.split())
+    len_a = len(words_a)
     best_match = None
     best_score = 0
 
-    for li in line_items:
-        li_desc = _cv(li, "description") or ""
-        li_lower = li_desc.lower()
-        if not li_lower:
-            continue
-
+    for li, li_lower, words_b in li_index:
         # Simple containment check
         if desc_lower in li_lower or li_lower in desc_lower:
             score = 100
-        else:
+        elif words_a or words_b:
             # Word overlap score
-            words_a = set(desc_lower.split())
-            words_b = set(li_lower.split())
             common = words_a & words_b
-            if words_a or words_b:
-                score = len(common) * 100 // max(len(words_a), len(words_b), 1)
-            else:
-                score = 0
+            score = len(common) * 100 // max(len_a, len(words_b), 1)
+        else:
+            score = 0
 
         if score > best_score:
             best_score = score
             best_match = li
+            # 100 is the maximum score; later items can't replace this match
+            if score == 100:
+                break
 
     return best_match if best_score >= 40 else None
 
@@ -272,15 +360,18 @@ def _check_multi_address(boxes: list[dict[str, Any]]) -> bool:
     if len(boxes) <= 1:
         return False
     first_addr = boxes[0].get("receiver_address", {})
-    first_key = (
-        first_addr.get("address", ""),
-        first_addr.get("city", ""),
-        first_addr.get("zip", ""),
-    )
+    first_address = first_addr.get("address", "")
+    first_city = first_addr.get("city", "")
+    first_zip = first_addr.get("zip", "")
     for box in boxes[1:]:
         addr = box.get("receiver_address", {})
-        key = (addr.get("address", ""), addr.get("city", ""), addr.get("zip", ""))
-        if key != first_key and any(key):
+        address = addr.get("address", "")
+        city = addr.get("city", "")
+        zip_code = addr.get("zip", "")
+        if (
+            (address != first_address or city != first_city or zip_code != first_zip)
+            and (address or city or zip_code)
+        ):
             return True
     return False
 
@@ -374,9 +465,15 @@ def build_draft_shipment(
     -------
     Tuple of (shipment_data, confidence_scores)
     """
-    # Separate files by type
-    invoices = [f for f in file_group if f.get("file_type") == "invoice"]
-    packing_lists = [f for f in file_group if f.get("file_type") == "packing_list"]
+    # Separate files by type (single pass)
+    invoices: list[dict[str, Any]] = []
+    packing_lists: list[dict[str, Any]] = []
+    for f in file_group:
+        file_type = f.get("file_type")
+        if file_type == "invoice":
+            invoices.append(f)
+        elif file_type == "packing_list":
+            packing_lists.append(f)
 
     # Use primary invoice and packing list
     invoice_data = {}
@@ -393,12 +490,12 @@ def build_draft_shipment(
     line_items = invoice_data.get("line_items", [])
 
     # Build mapped components
-    shipper_address = _map_address(invoice_data.get("exporter"))
-    invoice_receiver = _map_address(
+    shipper_address, shipper_conf = _map_address_with_conf(invoice_data.get("exporter"))
+    invoice_receiver, receiver_conf = _map_address_with_conf(
         invoice_data.get("ship_to") or invoice_data.get("consignee")
     )
-    billing_address = _map_address(invoice_data.get("consignee"))
-    ior_address = _map_address(invoice_data.get("ior"))
+    billing_address, billing_conf = _map_address_with_conf(invoice_data.get("consignee"))
+    ior_address, ior_conf = _map_address_with_conf(invoice_data.get("ior"))
     shipment_boxes = _map_boxes(packing_data, line_items)
     product_details = _map_products(line_items)
 
@@ -471,12 +568,10 @@ def build_draft_shipment(
 
     # Build confidence map
     confidence_scores = {
-        "shipper_address": _address_confidence(invoice_data.get("exporter")),
-        "receiver_address": _address_confidence(
-            invoice_data.get("ship_to") or invoice_data.get("consignee")
-        ),
-        "billing_address": _address_confidence(invoice_data.get("consignee")),
-        "ior_address": _address_confidence(invoice_data.get("ior")),
+        "shipper_address": shipper_conf,
+        "receiver_address": receiver_conf,
+        "billing_address": billing_conf,
+        "ior_address": ior_conf,
         "invoice_number": _confidence(invoice_data, "invoice_number"),
         "invoice_date": _confidence(invoice_data, "invoice_date"),
         "shipping_currency": _confidence(invoice_data, "currency"),
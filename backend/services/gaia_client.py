@@ -14,21 +14,26 @@ Request format for classification:
   {"input": {"name": "...", "description": "..."}, "destination_country": "US"}
 
 Tariff detail lookup:
-  GET /product/tariff-detail/{destination}/{code}/{origin}?include=pga_flags,remedy_flags
+  GET /product/tariff-detail/{destination}/{code}/{origin}?include=remedy_flags
 """
 from __future__ import annotations
 
+import asyncio
 import logging
+import random
 import re
+import time
 from typing import Any
 
 import httpx
+import orjson
 
 from backend.config import GAIA_API_URL, GAIA_API_KEY, GAIA_TIMEOUT_SECONDS
 
 logger = logging.getLogger(__name__)
 
 _DUTY_PERCENT_RE = re.compile(r"([\d.]+)\s*%")
+_DUTY_NUMBER_CHARS = frozenset("0123456789.")
 
 
 def _headers() -> dict[str, str]:
@@ -38,6 +43,97 @@ def _headers() -> dict[str, str]:
     }
 
 
+# Shared client so Gaia calls reuse pooled keep-alive connections instead
+# of paying a TCP+TLS handshake per request. Sized for enrichment bursts,
+# which issue a classify + tariff-detail request per distinct description.
+_http: httpx.AsyncClient | None = None
+
+
+def _get_http() -> httpx.AsyncClient:
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(
+            http2=True,
+            headers=_headers(),
+            timeout=GAIA_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_keepalive_connections=64,
+                max_connections=128,
+                keepalive_expiry=30,
+            ),
+        )
+    return _http
+
+
+async def close_http() -> None:
+    """Close the shared HTTP client (called on application shutdown)."""
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
+
+# Connect failures and 5xx responses are retried with jittered exponential
+# backoff. Every failed attempt counts towards the breaker: after
+# _BREAKER_FAIL_MAX consecutive failures the circuit opens and calls return
+# None immediately for _BREAKER_RESET_SECONDS, instead of every lookup
+# waiting out GAIA_TIMEOUT_SECONDS during an outage.
+_RETRY_ATTEMPTS = 3
+_RETRY_BASE_DELAY = 0.5
+_RETRY_MAX_DELAY = 4.0
+# Read/write timeouts are not retried: a Gaia that accepted the request but
+# didn't answer within GAIA_TIMEOUT_SECONDS is unlikely to on a second try.
+_RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+_BREAKER_FAIL_MAX = 10
+_BREAKER_RESET_SECONDS = 30.0
+
+_consecutive_failures = 0
+_breaker_open_until = 0.0
+
+
+def _breaker_open() -> bool:
+    return time.monotonic() < _breaker_open_until
+
+
+def _record_outcome(ok: bool) -> None:
+    global _consecutive_failures, _breaker_open_until
+    if ok:
+        _consecutive_failures = 0
+        return
+    _consecutive_failures += 1
+    if _consecutive_failures >= _BREAKER_FAIL_MAX:
+        _breaker_open_until = time.monotonic() + _BREAKER_RESET_SECONDS
+        _consecutive_failures = 0
+        logger.warning(
+            "Gaia circuit open for %.0fs after %d consecutive failures",
+            _BREAKER_RESET_SECONDS, _BREAKER_FAIL_MAX,
+        )
+
+
+async def _send(call: Any, url: str, **kwargs: Any) -> httpx.Response:
+    """Issue a Gaia request, retrying connect errors and 5xx with jittered backoff.
+
+    Each failed attempt is recorded with the breaker, and retries stop as
+    soon as it opens. The last 5xx response is returned to the caller.
+    """
+    for attempt in range(_RETRY_ATTEMPTS):
+        final = attempt == _RETRY_ATTEMPTS - 1
+        try:
+            resp = await call(url, **kwargs)
+        except httpx.TransportError as exc:
+            _record_outcome(False)
+            if final or not isinstance(exc, _RETRYABLE_ERRORS) or _breaker_open():
+                raise
+        else:
+            ok = resp.status_code < 500
+            _record_outcome(ok)
+            if ok or final or _breaker_open():
+                return resp
+        delay = min(_RETRY_MAX_DELAY, _RETRY_BASE_DELAY * 2 ** attempt)
+        await asyncio.sleep(random.uniform(0, delay))
+    raise AssertionError("unreachable")
+
+
 def parse_duty_rate(general_duty: str | None) -> float | None:
     """Extract numeric duty % from Gaia's rate_of_duty.general string.
 
@@ -47,6 +143,14 @@ def parse_duty_rate(general_duty: str | None) -> float | None:
         return None
     if general_duty.strip().lower() == "free":
         return 0.0
+    # Fast path for the common bare "N%" / "N.N%" form: skip the regex scan.
+    if general_duty[-1] == "%":
+        number = general_duty[:-1]
+        if number and _DUTY_NUMBER_CHARS.issuperset(number):
+            try:
+                return float(number)
+            except ValueError:
+                return None
     m = _DUTY_PERCENT_RE.search(general_duty)
     if m:
         try:
@@ -106,21 +210,20 @@ def calculate_cumulative_duty(
 
     for s in scenarios:
         tariff_info = s.get("tariff") or {}
-        is_approved = tariff_info.get("is_approved", False)
-        is_additional = tariff_info.get("is_additional", False)
-        is_rumored = tariff_info.get("is_rumored", False)
+        get = tariff_info.get
+        is_approved = get("is_approved", False)
+        is_additional = get("is_additional", False)
         value = s.get("value", 0) or 0
 
-        summary = {
-            "title": tariff_info.get("title", ""),
+        scenario_summaries.append({
+            "title": get("title", ""),
             "value": value,
             "is_additional": is_additional,
             "is_approved": is_approved,
-            "is_rumored": is_rumored,
-            "tariff_code": tariff_info.get("tariff_code", ""),
-            "tariff_category": tariff_info.get("tariff_category", ""),
-        }
-        scenario_summaries.append(summary)
+            "is_rumored": get("is_rumored", False),
+            "tariff_code": get("tariff_code", ""),
+            "tariff_category": get("tariff_category", ""),
+        })
 
         # XOS 3-condition gate
         if is_approved and is_additional and value >= 0:
@@ -130,7 +233,7 @@ def calculate_cumulative_duty(
 
     logger.info(
         "Duty calculation: base=%.2f + additional=%.2f = cumulative=%.2f (%d scenarios)",
-        base_rate, additional_sum, cumulative, len(scenario_summaries),
+        base_rate, additional_sum, cumulative, len(scenarios),
     )
 
     return base_rate, cumulative, scenario_summaries
@@ -149,6 +252,9 @@ async def classify_autonomous(
     if not GAIA_API_KEY:
         logger.warning("GAIA_API_KEY not set — skipping classification")
         return None
+    if _breaker_open():
+        logger.debug("Gaia circuit open — skipping classify for '%s'", name[:60])
+        return None
 
     url = f"{GAIA_API_URL}/product/classification/tariff-code/autonomous"
     body = {
@@ -160,20 +266,19 @@ async def classify_autonomous(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=GAIA_TIMEOUT_SECONDS) as client:
-            resp = await client.post(url, json=body, headers=_headers())
-            resp.raise_for_status()
-            payload = resp.json()
+        resp = await _send(_get_http().post, url, json=body)
+        resp.raise_for_status()
+        payload = orjson.loads(resp.content)
 
-            data = payload.get("data") or payload
-            code = data.get("best_guess_code", "")
-            confidence = data.get("confidence", "")
+        data = payload.get("data") or payload
+        code = data.get("best_guess_code", "")
+        confidence = data.get("confidence", "")
 
-            logger.info(
-                "Gaia classify: '%s' → %s (confidence=%s)",
-                name[:60], code, confidence,
-            )
-            return data
+        logger.info(
+            "Gaia classify: '%s' → %s (confidence=%s)",
+            name[:60], code, confidence,
+        )
+        return data
     except Exception:
         logger.warning("Gaia classify failed for '%s'", name[:60], exc_info=True)
         return None
@@ -184,7 +289,7 @@ async def get_tariff_detail(
     tariff_code: str,
     origin_country: str = "IN",
 ) -> dict[str, Any] | None:
-    """Get full tariff detail including scenarios, PGA flags, and remedy flags.
+    """Get full tariff detail including scenarios and remedy flags.
 
     The tariff_code should be the 10-digit HTS code (dots are stripped).
     Returns the inner "data" dict or None on failure.
@@ -196,26 +301,30 @@ async def get_tariff_detail(
     code_clean = tariff_code.replace(".", "")
     if not code_clean:
         return None
+    if _breaker_open():
+        logger.debug("Gaia circuit open — skipping tariff detail for %s", code_clean)
+        return None
 
     url = (
         f"{GAIA_API_URL}/product/tariff-detail"
         f"/{destination_country}/{code_clean}/{origin_country}"
-        f"?include=pga_flags,remedy_flags"
+        # Only remedy flags are read downstream; PGA flags would just bloat
+        # the payload we decode and cache.
+        f"?include=remedy_flags"
     )
 
     try:
-        async with httpx.AsyncClient(timeout=GAIA_TIMEOUT_SECONDS) as client:
-            resp = await client.get(url, headers=_headers())
-            resp.raise_for_status()
-            payload = resp.json()
+        resp = await _send(_get_http().get, url)
+        resp.raise_for_status()
+        payload = orjson.loads(resp.content)
 
-            data = payload.get("data") or payload
-            logger.info(
-                "Gaia tariff detail: %s/%s/%s → %d scenarios",
-                destination_country, code_clean, origin_country,
-                len(data.get("tariff_scenario") or []),
-            )
-            return data
+        data = payload.get("data") or payload
+        logger.info(
+            "Gaia tariff detail: %s/%s/%s → %d scenarios",
+            destination_country, code_clean, origin_country,
+            len(data.get("tariff_scenario") or []),
+        )
+        return data
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
             logger.info(
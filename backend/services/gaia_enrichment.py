@@ -30,14 +30,17 @@ from __future__ import annotations
 
 import asyncio
 import hashlib
-import json
 import logging
-from dataclasses import dataclass, field
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
 from typing import Any
 from uuid import UUID
 
+import orjson
+
 from backend import db
-from backend.config import normalize_country_code
+from backend.config import GAIA_MAX_CONCURRENCY, normalize_country_code
 from backend.services import gaia_client
 from backend.services.gaia_client import parse_duty_rate, calculate_cumulative_duty
 from backend.services.description_normalizer import normalize_description, llm_normalize_batch
@@ -48,18 +51,33 @@ logger = logging.getLogger(__name__)
 # LOW or missing confidence → skip tariff application entirely.
 _ALLOWED_CONFIDENCES = {"HIGH", "MEDIUM"}
 
+# Process-wide cap on in-flight classify+tariff lookups, so a large batch
+# of cache misses doesn't flood Gaia into 429s and timeouts.
+_GAIA_SEM = asyncio.Semaphore(GAIA_MAX_CONCURRENCY)
+
+# In-process LRU in front of the gaia_classifications table, so shipments
+# processed close together don't re-query Postgres for hot descriptions.
+# Keyed by desc_hash, which already encodes destination + origin.
+_RESULT_CACHE_MAX = 10_000
+_RESULT_CACHE_TTL_SECONDS = 60 * 60
+_result_cache: OrderedDict[str, tuple[float, GaiaResult]] = OrderedDict()
+
+# Above this many distinct raw descriptions, normalization runs in a worker
+# thread so a large shipment doesn't stall the event loop.
+_NORMALIZE_OFFLOAD_THRESHOLD = 500
+
 
 # ── Data structures ──────────────────────────────────────────────────────
 
-@dataclass
+@dataclass(slots=True)
 class ItemRef:
-    """Reference to a specific item inside a box (by index)."""
-    box_idx: int
-    item_idx: int
+    """Reference to a box item dict, or a product_details entry when is_product."""
+    item: dict[str, Any]
     original_description: str
+    is_product: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class DescriptionGroup:
     """A group of items sharing the same normalized description."""
     normalized: str
@@ -68,7 +86,7 @@ class DescriptionGroup:
     llm_normalized: str = ""  # Claude-enhanced description for Gaia
 
 
-@dataclass
+@dataclass(slots=True)
 class GaiaResult:
     """Parsed Gaia classification + tariff result ready to apply to items."""
     ihsn: str = ""
@@ -84,10 +102,72 @@ class GaiaResult:
 
 # ── Helpers ──────────────────────────────────────────────────────────────
 
-def _hash_key(normalized_desc: str, destination: str, origin: str) -> str:
-    """Deterministic cache key from normalized description + countries."""
-    raw = f"{normalized_desc}|{destination}|{origin}"
-    return hashlib.sha256(raw.encode()).hexdigest()
+def _key_hasher(destination: str, origin: str) -> Any:
+    """SHA-256 state pre-fed with the country prefix shared by a shipment."""
+    return hashlib.sha256(f"{destination}|{origin}|".encode())
+
+
+def _hash_key(normalized_desc: str, base_hasher: Any) -> str:
+    """Deterministic cache key: sha256("{destination}|{origin}|{normalized_desc}").
+
+    ``base_hasher`` comes from ``_key_hasher``; copying it avoids re-hashing
+    the constant country prefix for every item. This replaced the older
+    ``{normalized_desc}|{destination}|{origin}`` layout, so keys written
+    before the change never match; init_db truncates gaia_classifications.
+    """
+    h = base_hasher.copy()
+    h.update(normalized_desc.encode())
+    return h.hexdigest()
+
+
+def _cached_result(desc_hash: str) -> GaiaResult | None:
+    """Return an unexpired in-process result for ``desc_hash``, if any."""
+    entry = _result_cache.get(desc_hash)
+    if entry is None:
+        return None
+    expires_at, result = entry
+    if time.time() >= expires_at:
+        del _result_cache[desc_hash]
+        return None
+    _result_cache.move_to_end(desc_hash)
+    return result
+
+
+def _remember_result(desc_hash: str, result: GaiaResult) -> None:
+    """Store ``result`` in the in-process cache, evicting the oldest entries.
+
+    The raw Gaia responses are only needed for the DB write, so the cached
+    copy drops them rather than pinning large JSON for up to an hour.
+    """
+    if result.gaia_response is not None or result.tariff_response is not None:
+        result = replace(result, gaia_response=None, tariff_response=None)
+    _result_cache[desc_hash] = (time.time() + _RESULT_CACHE_TTL_SECONDS, result)
+    _result_cache.move_to_end(desc_hash)
+    while len(_result_cache) > _RESULT_CACHE_MAX:
+        _result_cache.popitem(last=False)
+
+
+def _bulk_normalize(descriptions: list[str]) -> list[str]:
+    """normalize_description over a list, for running off the event loop."""
+    return [normalize_description(d) for d in descriptions]
+
+
+def _compact_classification(data: dict[str, Any]) -> dict[str, Any]:
+    """Keep only the classification fields worth caching.
+
+    The autonomous response carries a full inline tariff_detail; only the
+    code, confidence, suggested description and general duty rate are ever
+    read back, so the rest isn't held in memory or written to the cache.
+    """
+    compact = {
+        key: data[key]
+        for key in ("best_guess_code", "confidence", "suggested_description")
+        if key in data
+    }
+    rod = (data.get("tariff_detail") or {}).get("rate_of_duty")
+    if rod:
+        compact["tariff_detail"] = {"rate_of_duty": rod}
+    return compact
 
 
 def _parse_gaia_response(
@@ -133,40 +213,33 @@ def _parse_gaia_response(
         confidence=confidence,
         tariff_scenarios=scenario_summaries,
         remedy_flags=remedy_flags,
-        gaia_response=classification_data,
+        gaia_response=_compact_classification(classification_data),
         tariff_response=tariff_data,
     )
 
 
-def _parse_cached_row(row: dict[str, Any]) -> GaiaResult:
-    """Convert a DB cache row into a GaiaResult."""
-    tariff_resp = row.get("tariff_response")
+def _jsonb(value: Any) -> Any:
+    """Decode a JSONB column value (asyncpg returns JSONB as text)."""
+    if isinstance(value, str):
+        return orjson.loads(value)
+    return value
 
-    # Reconstruct scenarios and remedy from cached tariff_response
-    base_rate: float | None = None
-    scenario_summaries: list[dict[str, Any]] = []
-    remedy_flags: dict[str, bool] = {}
 
-    if tariff_resp and isinstance(tariff_resp, dict):
-        base_rate, _, scenario_summaries = calculate_cumulative_duty(tariff_resp)
-        for flag in tariff_resp.get("flags") or []:
-            if flag.get("name") == "remedy":
-                val = flag.get("value") or {}
-                remedy_flags = {
-                    "add_risk": bool(val.get("possible_add_required_indicator")),
-                    "cvd_risk": bool(val.get("possible_cvd_duty_required_indicator")),
-                }
+def _parse_cached_row(row: dict[str, Any]) -> GaiaResult:
+    """Convert a DB cache row into a GaiaResult.
 
+    Scenarios, base rate and remedy flags are stored alongside duty_rate at
+    write time, so cache hits never re-run calculate_cumulative_duty. The raw
+    responses aren't read back on a hit, so they are neither fetched nor kept.
+    """
     return GaiaResult(
         ihsn=row.get("ihsn") or "",
         ehsn_fallback=row.get("ehsn") or "",
         duty_rate=row.get("duty_rate"),
-        base_duty_rate=base_rate,
+        base_duty_rate=row.get("base_duty_rate"),
         confidence=row.get("confidence") or "",
-        tariff_scenarios=scenario_summaries,
-        remedy_flags=remedy_flags,
-        gaia_response=row.get("classification_response"),
-        tariff_response=tariff_resp,
+        tariff_scenarios=_jsonb(row.get("tariff_scenarios")) or [],
+        remedy_flags=_jsonb(row.get("remedy_flags")) or {},
     )
 
 
@@ -250,67 +323,115 @@ async def enrich_items_with_gaia(
 
     # ── Step 1: Collect ALL items + normalize + deduplicate ──
     groups: dict[str, DescriptionGroup] = {}  # keyed by desc_hash
+    key_hasher = _key_hasher(destination_country, origin_country)
 
-    for b_idx, box in enumerate(boxes):
+    described: list[tuple[dict[str, Any], str]] = []
+    for box in boxes:
         items = box.get("shipment_box_items") or []
-        for i_idx, item in enumerate(items):
+        for item in items:
             description = item.get("description") or ""
-            if not description.strip():
-                continue
+            if description.strip():
+                described.append((item, description))
 
-            norm_desc = normalize_description(description)
-            if not norm_desc:
-                continue
-
-            desc_hash = _hash_key(norm_desc, destination_country, origin_country)
+    # product_details (customs summary) share the same normalize + hash pass
+    product_details = shipment_data.get("product_details") or []
+    described_products: list[tuple[dict[str, Any], str]] = []
+    for product in product_details:
+        description = product.get("product_description") or ""
+        if description.strip():
+            described_products.append((product, description))
+
+    # Normalize + hash each distinct raw description once
+    unique_descs = list(dict.fromkeys(
+        d for _, d in (*described, *described_products)
+    ))
+    if len(unique_descs) >= _NORMALIZE_OFFLOAD_THRESHOLD:
+        normalized = await asyncio.to_thread(_bulk_normalize, unique_descs)
+    else:
+        normalized = _bulk_normalize(unique_descs)
+    keyed = {
+        raw: (norm, _hash_key(norm, key_hasher))
+        for raw, norm in zip(unique_descs, normalized)
+        if norm
+    }
+
+    for item, description in described:
+        entry = keyed.get(description)
+        if entry is None:
+            continue
+        norm_desc, desc_hash = entry
 
-            if desc_hash not in groups:
-                groups[desc_hash] = DescriptionGroup(
-                    normalized=norm_desc,
-                    desc_hash=desc_hash,
-                )
-            groups[desc_hash].items.append(
-                ItemRef(box_idx=b_idx, item_idx=i_idx, original_description=description)
+        if desc_hash not in groups:
+            groups[desc_hash] = DescriptionGroup(
+                normalized=norm_desc,
+                desc_hash=desc_hash,
             )
+        groups[desc_hash].items.append(
+            ItemRef(item=item, original_description=description)
+        )
+    total_items = sum(len(g.items) for g in groups.values())
+
+    # Products only ride along on descriptions the box items already need
+    for product, description in described_products:
+        entry = keyed.get(description)
+        if entry is None or entry[1] not in groups:
+            continue
+        groups[entry[1]].items.append(
+            ItemRef(item=product, original_description=description, is_product=True)
+        )
 
     if not groups:
         return shipment_data
 
     distinct_count = len(groups)
-    total_items = sum(len(g.items) for g in groups.values())
     logger.info(
         "Gaia enrichment: %d total items → %d distinct descriptions",
         total_items, distinct_count,
     )
 
-    # ── Step 2: Batch cache check for ALL distinct hashes ──
-    all_hashes = list(groups.keys())
+    # ── Step 2: Cache check — in-process first, then one DB batch query ──
+    results: dict[str, GaiaResult] = {}  # keyed by desc_hash
+    db_hashes: list[str] = []
+    for desc_hash in groups:
+        local = _cached_result(desc_hash)
+        if local is not None:
+            results[desc_hash] = local
+        else:
+            db_hashes.append(desc_hash)
+
     cached_rows: dict[str, dict[str, Any]] = {}
-    try:
-        cached_rows = await db.get_gaia_classifications_batch(
-            all_hashes, destination_country, origin_country,
-        )
-    except Exception:
-        logger.warning("Gaia batch cache lookup failed", exc_info=True)
+    if db_hashes:
+        try:
+            cached_rows = await db.get_gaia_classifications_batch(
+                db_hashes, destination_country, origin_country,
+            )
+        except Exception:
+            logger.warning("Gaia batch cache lookup failed", exc_info=True)
 
-    cache_hits = len(cached_rows)
+    cache_hits = len(results) + len(cached_rows)
     cache_misses = distinct_count - cache_hits
-    logger.info(
+    # Fully warm shipments are the common case; keep them quiet at INFO.
+    logger.log(
+        logging.INFO if cache_misses else logging.DEBUG,
         "Gaia cache: %d hits, %d misses out of %d distinct",
         cache_hits, cache_misses, distinct_count,
     )
 
     # ── Step 3: Apply cached results immediately ──
-    results: dict[str, GaiaResult] = {}  # keyed by desc_hash
     miss_hashes: list[str] = []
 
-    for desc_hash, group in groups.items():
+    for desc_hash in db_hashes:
         if desc_hash in cached_rows:
             results[desc_hash] = _parse_cached_row(cached_rows[desc_hash])
+            _remember_result(desc_hash, results[desc_hash])
         else:
             miss_hashes.append(desc_hash)
 
-    # ── Step 3b: LLM-normalize descriptions for cache misses (one batch call) ──
+    # ── Step 3b: LLM-normalize descriptions for cache misses ──
+    # llm_normalize_batch sends one call per 20 unique descriptions, with
+    # at most LLM_NORMALIZE_MAX_CONCURRENCY chunks in flight (_LLM_SEM).
+    # Steps 3b and 4 are skipped entirely on a fully warm cache, so no
+    # further awaits happen before results are fanned out.
     if miss_hashes:
         miss_originals: list[str] = []
         for h in miss_hashes:
@@ -332,92 +453,102 @@ async def enrich_items_with_gaia(
                 )
 
     # ── Step 4: Classify + tariff lookup in PARALLEL for cache misses ──
+    # Pipelined: each tariff-detail lookup is scheduled as soon as its
+    # classification lands, overlapping with classifications still running.
     if miss_hashes:
-        async def _classify_and_lookup(h: str) -> tuple[str, GaiaResult | None]:
-            """Two-step: classify → tariff detail → cumulative duty."""
+        async def _classify(h: str) -> tuple[str, dict[str, Any] | None]:
+            """Step 4a: Classify to get IHSN code."""
             g = groups[h]
-
             # Use LLM-normalized description for Gaia if available, else regex
             gaia_desc = g.llm_normalized or g.normalized
+            async with _GAIA_SEM:
+                return h, await gaia_client.classify_autonomous(
+                    name=gaia_desc,
+                    description=gaia_desc,
+                    destination_country=destination_country,
+                )
 
-            # Step 4a: Classify to get IHSN code
-            classification = await gaia_client.classify_autonomous(
-                name=gaia_desc,
-                description=gaia_desc,
-                destination_country=destination_country,
-            )
-            if not classification:
-                return (h, None)
-
-            # Step 4b: Get tariff detail for the classified code
-            ihsn_code = classification.get("best_guess_code") or ""
-            tariff_detail = None
-            if ihsn_code:
-                tariff_detail = await gaia_client.get_tariff_detail(
+        async def _tariff(ihsn_code: str) -> dict[str, Any] | None:
+            """Step 4b: Get tariff detail for the classified code."""
+            async with _GAIA_SEM:
+                return await gaia_client.get_tariff_detail(
                     destination_country=destination_country,
                     tariff_code=ihsn_code,
                     origin_country=origin_country,
                 )
 
-            return (h, _parse_gaia_response(classification, tariff_detail))
+        classifications: dict[str, dict[str, Any]] = {}
+        # Distinct descriptions often share an IHSN code, so tariff-detail
+        # is fetched once per code and shared across their groups.
+        tariff_tasks: dict[str, asyncio.Task] = {}  # keyed by IHSN code
+        classify_tasks = [asyncio.create_task(_classify(h)) for h in miss_hashes]
+
+        for next_done in asyncio.as_completed(classify_tasks):
+            try:
+                h, classification = await next_done
+            except Exception as e:
+                logger.warning("Gaia parallel classify failed: %s", e)
+                continue
+            if not classification:
+                continue
+            classifications[h] = classification
+            ihsn_code = classification.get("best_guess_code") or ""
+            if ihsn_code and ihsn_code not in tariff_tasks:
+                tariff_tasks[ihsn_code] = asyncio.create_task(_tariff(ihsn_code))
+
+        tariff_results = await asyncio.gather(*tariff_tasks.values(), return_exceptions=True)
+        tariffs = dict(zip(tariff_tasks, tariff_results))
 
-        # Run all two-step lookups concurrently
-        tasks = [_classify_and_lookup(h) for h in miss_hashes]
-        gaia_results = await asyncio.gather(*tasks, return_exceptions=True)
+        cache_rows: list[dict[str, Any]] = []
+        for h, classification in classifications.items():
+            tariff_detail = tariffs.get(classification.get("best_guess_code") or "")
+            if isinstance(tariff_detail, Exception):
+                logger.warning("Gaia parallel tariff lookup failed: %s", tariff_detail)
+                tariff_detail = None
 
-        for result in gaia_results:
-            if isinstance(result, Exception):
-                logger.warning("Gaia parallel call failed: %s", result)
-                continue
-            h, parsed = result
-            if parsed:
-                results[h] = parsed
-
-                # Cache the new result (with cumulative duty and tariff_response)
-                g = groups[h]
-                try:
-                    await db.upsert_gaia_classification(
-                        desc_hash=h,
-                        normalized_description=g.normalized,
-                        destination=destination_country,
-                        origin=origin_country,
-                        ehsn=parsed.ehsn_fallback,
-                        ihsn=parsed.ihsn,
-                        duty_rate=parsed.duty_rate,
-                        confidence=parsed.confidence,
-                        classification_response=parsed.gaia_response,
-                        tariff_response=parsed.tariff_response,
-                        llm_normalized=g.llm_normalized or None,
-                    )
-                except Exception:
-                    logger.warning("Failed to cache Gaia result for hash %s", h[:12], exc_info=True)
-
-    # ── Step 5: Fan results back to ALL items ──
+            parsed = _parse_gaia_response(classification, tariff_detail)
+            results[h] = parsed
+            _remember_result(h, parsed)
+
+            # Queue the new result for caching (with cumulative duty and tariff_response)
+            g = groups[h]
+            cache_rows.append({
+                "desc_hash": h,
+                "normalized_description": g.normalized,
+                "destination": destination_country,
+                "origin": origin_country,
+                "ehsn": parsed.ehsn_fallback,
+                "ihsn": parsed.ihsn,
+                "duty_rate": parsed.duty_rate,
+                "confidence": parsed.confidence,
+                "classification_response": parsed.gaia_response,
+                "tariff_response": parsed.tariff_response,
+                "llm_normalized": g.llm_normalized or None,
+                "base_duty_rate": parsed.base_duty_rate,
+                "tariff_scenarios": parsed.tariff_scenarios,
+                "remedy_flags": parsed.remedy_flags,
+            })
+
+        # Cache all new results in one round trip
+        try:
+            await db.upsert_gaia_classifications_batch(cache_rows)
+        except Exception:
+            logger.warning("Failed to cache %d Gaia results", len(cache_rows), exc_info=True)
+
+    # ── Step 5: Fan results back to ALL items and product_details[] ──
     applied = 0
+    products_enriched = 0
     for desc_hash, group in groups.items():
         result = results.get(desc_hash)
         if not result:
             continue
         for ref in group.items:
-            item = boxes[ref.box_idx]["shipment_box_items"][ref.item_idx]
-            _apply_result(item, result, group.normalized)
-            applied += 1
-
-    # ── Step 6: Also enrich product_details[] (customs summary) ──
-    product_details = shipment_data.get("product_details") or []
-    products_enriched = 0
-    for product in product_details:
-        desc = product.get("product_description") or ""
-        if not desc.strip():
-            continue
-        norm_desc = normalize_description(desc)
-        if not norm_desc:
-            continue
-        desc_hash = _hash_key(norm_desc, destination_country, origin_country)
-        result = results.get(desc_hash)
-        if result:
-            _apply_result_to_product(product, result, norm_desc)
-            products_enriched += 1
+            if ref.is_product:
+                _apply_result_to_product(ref.item, result, group.normalized)
+                products_enriched += 1
+            else:
+                _apply_result(ref.item, result, group.normalized)
+                applied += 1
 
     logger.info(
         "Gaia enrichment complete: %d/%d box items, %d/%d products enriched (%d distinct)",
@@ -442,7 +573,7 @@ async def classify_draft_items(draft_id: UUID) -> dict[str, Any] | None:
     # Use corrected_data if available, else shipment_data
     sd = draft.get("corrected_data") or draft.get("shipment_data") or {}
     if isinstance(sd, str):
-        sd = json.loads(sd)
+        sd = orjson.loads(sd)
 
     # Determine destination country from receiver address
     receiver = sd.get("receiver_address") or {}
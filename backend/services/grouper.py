@@ -8,10 +8,12 @@ from __future__ import annotations
 
 import logging
 import re
+import sys
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Any
 
-from thefuzz import fuzz
+from rapidfuzz import fuzz
 
 from backend.utils import normalize_name as _normalize_name
 
@@ -20,6 +22,11 @@ logger = logging.getLogger(__name__)
 # Minimum fuzzy match ratio to consider names equivalent
 _FUZZY_THRESHOLD = 85
 
+# rapidfuzz returns float ratios; scores are rounded to the integer ratios
+# thefuzz produced, so this cutoff lets the C scorer bail out early on
+# anything that cannot round up to the threshold.
+_FUZZY_CUTOFF = _FUZZY_THRESHOLD - 0.5
+
 # Maximum days apart for dates to be considered "same shipment"
 _DATE_RANGE_DAYS = 7
 
@@ -54,18 +61,33 @@ def _get_value(data: dict[str, Any], *paths: str) -> str | None:
     return None
 
 
+_DATE_FORMATS = (
+    "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%m/%d/%Y",
+    "%d.%m.%Y", "%Y/%m/%d", "%d %b %Y", "%d %B %Y",
+    "%B %d, %Y", "%b %d, %Y",
+)
+
+# ISO dates dominate LLM output; parsing them directly avoids strptime
+_ISO_DATE_RE = re.compile(r"([0-9]{4})-([0-9]{2})-([0-9]{2})")
+
+
+@lru_cache(maxsize=4096)
 def _parse_date(date_str: str | None) -> datetime | None:
     """Try to parse a date string in common formats."""
     if not date_str:
         return None
 
-    for fmt in [
-        "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%m/%d/%Y",
-        "%d.%m.%Y", "%Y/%m/%d", "%d %b %Y", "%d %B %Y",
-        "%B %d, %Y", "%b %d, %Y",
-    ]:
+    date_str = date_str.strip()
+    m = _ISO_DATE_RE.fullmatch(date_str)
+    if m:
+        try:
+            return datetime(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        except ValueError:
+            pass
+
+    for fmt in _DATE_FORMATS:
         try:
-            return datetime.strptime(date_str.strip(), fmt)
+            return datetime.strptime(date_str, fmt)
         except ValueError:
             continue
     return None
@@ -83,7 +105,8 @@ _IDENTIFIER_RE = re.compile(
 )
 
 
-def _filename_identifiers(filename: str) -> set[str]:
+@lru_cache(maxsize=4096)
+def _filename_identifiers(filename: str) -> frozenset[str]:
     """Extract identifier-like tokens from a filename.
 
     E.g. "01. INVOICE_WFS-042025-26 - inv.pdf" → {"WFS-042025-26"}
@@ -91,18 +114,29 @@ def _filename_identifiers(filename: str) -> set[str]:
     """
     stem = filename.rsplit(".", 1)[0] if "." in filename else filename
     tokens = _IDENTIFIER_RE.findall(stem)
-    return {t.upper() for t in tokens if len(t) >= 3}
+    return frozenset(t.upper() for t in tokens if len(t) >= 3)
+
+
+def _intern_upper(value: str | None) -> str | None:
+    return sys.intern(value.upper()) if value else None
 
 
 class _FileMetadata:
     """Extracted metadata from a single file for grouping purposes."""
 
+    __slots__ = (
+        "file_id", "file_type", "data", "filename", "filename_ids",
+        "invoice_number", "po_number", "seller_name", "buyer_name",
+        "date_str", "date", "dest_country", "container_number",
+        "invoice_key", "po_key", "dest_key", "container_key",
+    )
+
     def __init__(self, file_id: str, file_type: str, extracted_data: dict[str, Any], filename: str = ""):
         self.file_id = file_id
         self.file_type = file_type
         self.data = extracted_data or {}
         self.filename = filename
-        self.filename_ids = _filename_identifiers(filename) if filename else set()
+        self.filename_ids = _filename_identifiers(filename) if filename else frozenset()
 
         # Extract key fields depending on document type
         if file_type == "invoice":
@@ -152,8 +186,39 @@ class _FileMetadata:
             self.dest_country = _get_value(self.data, "country", "destination_country")
             self.container_number = _get_value(self.data, "container_number", "bl_number")
 
-
-def _match_score(file_meta: _FileMetadata, group_metas: list[_FileMetadata]) -> float:
+        # Upper-cased exact-match keys, computed once instead of per comparison.
+        # Keys and names repeat across an upload's files, so they are interned:
+        # equal values share one object and == hits the identity fast path.
+        self.invoice_key = _intern_upper(self.invoice_number)
+        self.po_key = _intern_upper(self.po_number)
+        self.dest_key = _intern_upper(self.dest_country)
+        self.container_key = _intern_upper(self.container_number)
+        if self.seller_name:
+            self.seller_name = sys.intern(self.seller_name)
+        if self.buyer_name:
+            self.buyer_name = sys.intern(self.buyer_name)
+
+    def index_keys(self) -> set[tuple[str, str]]:
+        """Exact-match keys used to find likely candidate groups quickly."""
+        keys = {("fname", t) for t in self.filename_ids}
+        if self.invoice_key:
+            keys.add(("invoice", self.invoice_key))
+        if self.po_key:
+            keys.add(("po", self.po_key))
+        if self.container_key:
+            keys.add(("container", self.container_key))
+        return keys
+
+
+# Most the two fuzzy name signals (seller 0.25 + buyer 0.15) can add
+_MAX_NAME_SCORE = 0.40
+
+
+def _match_score(
+    file_meta: _FileMetadata,
+    group_metas: list[_FileMetadata],
+    floor: float = 0.0,
+) -> float:
     """Compute a matching score between a file and a group (0.0 to 1.0).
 
     Uses weighted signals:
@@ -163,55 +228,94 @@ def _match_score(file_meta: _FileMetadata, group_metas: list[_FileMetadata]) ->
       - Date proximity: 0.10
       - Destination country: 0.10
       - Container/BL number: 0.05
+
+    The fuzzy name comparisons are skipped for group members that could not
+    beat ``floor`` (or the group's best so far) even with perfect name
+    matches; the result is then a lower bound that still falls short of
+    ``floor``, which is all the caller needs to rule the group out.
     """
+    # Highest score any member could reach given which fields this file has,
+    # summed in the same order as below so a perfect match compares equal
+    ceiling = (
+        0.0
+        + (0.35 if file_meta.invoice_key or file_meta.po_key else 0.0)
+        + (0.25 if file_meta.seller_name else 0.0)
+        + (0.15 if file_meta.buyer_name else 0.0)
+        + (0.10 if file_meta.date else 0.0)
+        + (0.10 if file_meta.dest_key else 0.0)
+        + (0.05 if file_meta.container_key else 0.0)
+        + (0.30 if file_meta.filename_ids else 0.0)
+    )
     best_score = 0.0
 
     for gm in group_metas:
-        score = 0.0
+        if best_score >= ceiling:
+            break  # no remaining member can score higher
 
         # 1. Invoice / PO number exact match (strongest signal)
-        if file_meta.invoice_number and gm.invoice_number:
-            if file_meta.invoice_number.upper() == gm.invoice_number.upper():
-                score += 0.35
-        elif file_meta.po_number and gm.po_number:
-            if file_meta.po_number.upper() == gm.po_number.upper():
-                score += 0.35
-
-        # 2. Seller/exporter name fuzzy match
-        if file_meta.seller_name and gm.seller_name:
-            ratio = fuzz.ratio(file_meta.seller_name, gm.seller_name)
-            if ratio >= _FUZZY_THRESHOLD:
-                score += 0.25 * (ratio / 100.0)
-
-        # 3. Buyer/consignee name fuzzy match
-        if file_meta.buyer_name and gm.buyer_name:
-            ratio = fuzz.ratio(file_meta.buyer_name, gm.buyer_name)
-            if ratio >= _FUZZY_THRESHOLD:
-                score += 0.15 * (ratio / 100.0)
+        inv_score = 0.0
+        if file_meta.invoice_key and gm.invoice_key:
+            if file_meta.invoice_key == gm.invoice_key:
+                inv_score = 0.35
+        elif file_meta.po_key and gm.po_key:
+            if file_meta.po_key == gm.po_key:
+                inv_score = 0.35
 
         # 4. Date proximity
+        date_score = 0.0
         if file_meta.date and gm.date:
             delta = abs((file_meta.date - gm.date).days)
             if delta <= _DATE_RANGE_DAYS:
-                score += 0.10 * (1.0 - delta / _DATE_RANGE_DAYS)
+                date_score = 0.10 * (1.0 - delta / _DATE_RANGE_DAYS)
 
         # 5. Destination country
-        if file_meta.dest_country and gm.dest_country:
-            if file_meta.dest_country.upper() == gm.dest_country.upper():
-                score += 0.10
+        dest_score = 0.0
+        if file_meta.dest_key and gm.dest_key:
+            if file_meta.dest_key == gm.dest_key:
+                dest_score = 0.10
 
         # 6. Container / BL number
-        if file_meta.container_number and gm.container_number:
-            if file_meta.container_number.upper() == gm.container_number.upper():
-                score += 0.05
+        container_score = 0.0
+        if file_meta.container_key and gm.container_key:
+            if file_meta.container_key == gm.container_key:
+                container_score = 0.05
 
         # 7. Filename identifier overlap (fallback when LLM fields are sparse)
+        fname_score = 0.0
         if file_meta.filename_ids and gm.filename_ids:
-            overlap = file_meta.filename_ids & gm.filename_ids
-            if overlap:
+            if not file_meta.filename_ids.isdisjoint(gm.filename_ids):
                 # Strong signal: shared identifier tokens in filenames
-                score += 0.30
+                fname_score = 0.30
 
+        cheap = inv_score + date_score + dest_score + container_score + fname_score
+        if cheap + _MAX_NAME_SCORE < max(best_score, floor) - 1e-9:
+            best_score = max(best_score, cheap)
+            continue
+
+        # 2. Seller/exporter name fuzzy match
+        seller_score = 0.0
+        if file_meta.seller_name and gm.seller_name:
+            ratio = round(fuzz.ratio(
+                file_meta.seller_name, gm.seller_name, score_cutoff=_FUZZY_CUTOFF,
+            ))
+            if ratio >= _FUZZY_THRESHOLD:
+                seller_score = 0.25 * (ratio / 100.0)
+
+        # 3. Buyer/consignee name fuzzy match
+        buyer_score = 0.0
+        if file_meta.buyer_name and gm.buyer_name:
+            ratio = round(fuzz.ratio(
+                file_meta.buyer_name, gm.buyer_name, score_cutoff=_FUZZY_CUTOFF,
+            ))
+            if ratio >= _FUZZY_THRESHOLD:
+                buyer_score = 0.15 * (ratio / 100.0)
+
+        # Summed in signal order so scores are bit-identical regardless of
+        # which signals were evaluated first
+        score = (
+            0.0 + inv_score + seller_score + buyer_score + date_score
+            + dest_score + container_score + fname_score
+        )
         best_score = max(best_score, score)
 
     return best_score
@@ -260,32 +364,50 @@ def group_files_into_shipments(
 
     # Greedy grouping: try to assign each file to an existing group
     groups: list[list[_FileMetadata]] = []
+    # Reverse index: exact-match key → indices of groups containing it
+    key_index: dict[tuple[str, str], set[int]] = {}
 
     for meta in metas:
         best_group_idx = -1
         best_score = 0.0
 
-        for idx, group in enumerate(groups):
-            score = _match_score(meta, group)
-            if score > best_score and score >= _GROUP_THRESHOLD:
+        # Score groups sharing an exact key first: they usually win, and a
+        # high best_score early lets _match_score skip fuzzy comparisons for
+        # the remaining groups. Ties still go to the lowest group index.
+        meta_keys = meta.index_keys()
+        candidates: set[int] = set()
+        for key in meta_keys:
+            candidates |= key_index.get(key, set())
+        order = sorted(candidates) + [i for i in range(len(groups)) if i not in candidates]
+
+        for idx in order:
+            floor = max(best_score, _GROUP_THRESHOLD)
+            score = _match_score(meta, groups[idx], floor)
+            if score < _GROUP_THRESHOLD:
+                continue
+            if score > best_score or (score == best_score and idx < best_group_idx):
                 best_score = score
                 best_group_idx = idx
 
-        if best_group_idx >= 0:
-            groups[best_group_idx].append(meta)
+        if best_group_idx < 0:
+            groups.append([meta])
+            best_group_idx = len(groups) - 1
             logger.debug(
-                "Grouped '%s' (%s) with group %d (score=%.2f, inv=%s, seller=%s, fname_ids=%s)",
-                meta.filename, meta.file_type, best_group_idx, best_score,
+                "New group %d for '%s' (%s): inv=%s, seller=%s, fname_ids=%s",
+                best_group_idx, meta.filename, meta.file_type,
                 meta.invoice_number, meta.seller_name, meta.filename_ids,
             )
         else:
-            groups.append([meta])
+            groups[best_group_idx].append(meta)
             logger.debug(
-                "New group %d for '%s' (%s): inv=%s, seller=%s, fname_ids=%s",
-                len(groups) - 1, meta.filename, meta.file_type,
+                "Grouped '%s' (%s) with group %d (score=%.2f, inv=%s, seller=%s, fname_ids=%s)",
+                meta.filename, meta.file_type, best_group_idx, best_score,
                 meta.invoice_number, meta.seller_name, meta.filename_ids,
             )
 
+        for key in meta_keys:
+            key_index.setdefault(key, set()).add(best_group_idx)
+
     # Build output
     result = []
     for group in groups:
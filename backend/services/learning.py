@@ -5,44 +5,28 @@ and formats them as examples that can be injected into extraction prompts.
 """
 from __future__ import annotations
 
-import json
 import logging
+import time
 from typing import Any
 from uuid import UUID
 
+import orjson
+
 from backend import db
 
 logger = logging.getLogger(__name__)
 
+# Formatted extraction hints, keyed by (seller_id, field_paths). Hints are
+# rebuilt per extraction from a slow-moving corrections table, so a short
+# TTL removes the DB round trip + JSON parsing for back-to-back uploads.
+_HINT_CACHE_TTL_SECONDS = 60
+_HINT_CACHE_MAX = 256
+_hint_cache: dict[tuple[UUID | None, tuple[str, ...]], tuple[float, str]] = {}
 
-async def get_few_shot_examples(
-    field_path: str,
-    limit: int = 3,
-    seller_id: UUID | None = None,
-) -> list[dict[str, Any]]:
-    """Retrieve recent corrections for a field to use as few-shot examples.
-
-    Parameters
-    ----------
-    field_path:
-        Dot-separated field path, e.g. "shipper_address.city"
-    limit:
-        Maximum number of examples to return.
-    seller_id:
-        When provided, corrections are scoped to this seller.
-
-    Returns
-    -------
-    List of dicts with keys: field_path, original_value, corrected_value, file_context
-    """
-    try:
-        rows = await db.get_corrections_for_field(
-            field_path, limit=limit, seller_id=seller_id,
-        )
-        return rows
-    except Exception:
-        logger.warning("Failed to fetch corrections for %s", field_path, exc_info=True)
-        return []
+
+def invalidate_hint_cache() -> None:
+    """Drop cached extraction hints; call after a correction is saved."""
+    _hint_cache.clear()
 
 
 def format_correction_context(
@@ -61,13 +45,13 @@ def format_correction_context(
         corrected = c.get("corrected_value")
         if isinstance(orig, str):
             try:
-                orig = json.loads(orig)
-            except (json.JSONDecodeError, TypeError):
+                orig = orjson.loads(orig)
+            except (orjson.JSONDecodeError, TypeError):
                 pass
         if isinstance(corrected, str):
             try:
-                corrected = json.loads(corrected)
-            except (json.JSONDecodeError, TypeError):
+                corrected = orjson.loads(corrected)
+            except (orjson.JSONDecodeError, TypeError):
                 pass
 
         lines.append(
@@ -97,12 +81,27 @@ async def build_extraction_hint(
             "shipping_currency",
         ]
 
-    all_corrections = []
-    for fp in field_paths:
-        examples = await get_few_shot_examples(fp, limit=2, seller_id=seller_id)
-        all_corrections.extend(examples)
+    cache_key = (seller_id, tuple(field_paths))
+    cached = _hint_cache.get(cache_key)
+    if cached and time.time() < cached[0]:
+        return cached[1]
+
+    # One query for all fields instead of a round trip per field
+    try:
+        by_field = await db.get_corrections_for_fields(
+            field_paths, limit_per=2, seller_id=seller_id,
+        )
+    except Exception:
+        logger.warning("Failed to fetch corrections for extraction hint", exc_info=True)
+        return ""
+
+    all_corrections = [ex for fp in field_paths for ex in by_field.get(fp, [])]
+    hint = format_correction_context(all_corrections)
 
-    return format_correction_context(all_corrections)
+    if len(_hint_cache) >= _HINT_CACHE_MAX:
+        _hint_cache.clear()
+    _hint_cache[cache_key] = (time.time() + _HINT_CACHE_TTL_SECONDS, hint)
+    return hint
 
 
 async def get_correction_stats() -> list[dict[str, Any]]:
@@ -6,9 +6,10 @@ documents.
 
 Uses two separate LLM calls to handle large packing lists:
   - Call 1 (Invoice): Haiku 4.5, extracts line items, addresses, amounts
+    with a single confidence per section
   - Call 2 (Packing List): Sonnet 4.5 with higher token limit, extracts
-    destinations array + all boxes using a flat (no confidence wrapper)
-    schema to minimize token usage
+    destinations array + all boxes
+Both schemas are flat (no per-field confidence wrapper) to minimize token usage.
 Both calls run concurrently via asyncio.gather, then results are merged.
 """
 from __future__ import annotations
@@ -18,10 +19,14 @@ import base64
 import json
 import logging
 import re
-from functools import partial
-from typing import Any
+from collections.abc import Iterator
+from dataclasses import dataclass
+from functools import lru_cache
+from statistics import fmean
+from typing import Any, Literal
 
 import anthropic
+import orjson
 
 from backend.config import (
     ANTHROPIC_API_KEY,
@@ -46,24 +51,105 @@ from backend.models.extraction import (
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
-# Anthropic client (synchronous -- wrapped in asyncio below)
+# Anthropic client (native async -- no executor threads needed)
 # ---------------------------------------------------------------------------
-_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+_client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
 
 # ---------------------------------------------------------------------------
 # System prompts -- one per extraction call
 # ---------------------------------------------------------------------------
 
+# Schema examples are kept as dicts and embedded as compact JSON: indentation
+# and repeated sub-objects are pure input-token overhead on every call.
+# Both schemas are flat; the invoice carries one "confidence" per section
+# instead of a {"value", "confidence"} wrapper on every leaf.
+_ADDRESS_FIELDS = ("name", "address", "city", "state", "zip_code", "country", "phone", "email")
+
+
+def _compact_json(obj: Any) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+# The address shape shared by all four invoice parties, declared once.
+_ADDRESS_SCHEMA = {"confidence": 0.9, **{f: "..." for f in _ADDRESS_FIELDS}}
+
+_INVOICE_ROLES = ("exporter", "consignee", "ship_to", "ior")
+
+_INVOICE_SCHEMA = {
+    "invoice": {
+        "confidence": 0.9,
+        "invoice_number": "...",
+        "invoice_date": "...",
+        "currency": "USD",
+        "total_amount": 12500.00,
+        **{role: "ADDR" for role in _INVOICE_ROLES},
+        "line_items": [
+            {
+                "confidence": 0.9,
+                "description": "...",
+                "hs_code_origin": "74181000",
+                "hs_code_destination": "74181000",
+                "quantity": 500,
+                "unit_price_usd": 12.50,
+                "total_price_usd": 6250.00,
+                "unit_weight_kg": 0.35,
+                "igst_percent": 18,
+                "country_of_origin": (
+                    "2-letter ISO code e.g. IN, CN, US. Default IN for Indian exports if not specified"
+                ),
+                "duty_rate": "customs duty rate percentage if mentioned on invoice, else null",
+                "unit_fob_value": "FOB value per unit in USD if mentioned, else null",
+            }
+        ],
+    }
+}
+
+_PACKING_LIST_SCHEMA = {
+    "invoice_number": "WFS-042025-26",
+    "exporter_name": "Redplum Pvt Ltd",
+    "consignee_name": "WALMART",
+    "total_boxes": 105,
+    "total_net_weight_kg": 450.5,
+    "total_gross_weight_kg": 520.0,
+    "destinations": [
+        {
+            "id": "D1",
+            "name": "Amazon FBA FTW1",
+            "address": "33333 Lyndon B Johnson Fwy",
+            "city": "Dallas",
+            "state": "TX",
+            "zip_code": "75241",
+            "country": "US",
+            "phone": "",
+            "email": "",
+        }
+    ],
+    "boxes": [
+        {
+            "box_number": 1,
+            "destination_id": "D1",
+            "length_cm": 40,
+            "width_cm": 30,
+            "height_cm": 25,
+            "gross_weight_kg": 5.2,
+            "net_weight_kg": 4.8,
+            "items": [{"description": "Copper Bottle 750ml", "quantity": 10}],
+        }
+    ],
+}
+
 _INVOICE_PROMPT = """\
 You are extracting data from Indian export invoices for cross-border shipments.
 
 INSTRUCTIONS:
 - Extract ONLY invoice data: line items, addresses, amounts. Ignore packing list / box data.
-- If a field is not found in the document, set value to null and confidence to 0.0
+- If a field is not found in the document, set it to null.
 - For HS codes, extract the full 8-digit code. If only 6 digits visible, pad with 00.
 - All weights must be in kilograms. Convert if in grams or pounds.
 - All prices should be in USD. If in INR, note the original currency but keep the value as-is.
-- Rate your confidence 0.0-1.0 for each field based on how clearly it appears in the document.
+- Use FLAT values (plain strings/numbers) -- do NOT use {"value":..., "confidence":...} wrappers. \
+Instead rate your confidence 0.0-1.0 once per object (invoice header, each address, each line item) \
+in its "confidence" key, based on how clearly those fields appear in the document.
 - ADDRESSES: Extract all 4 addresses carefully. "exporter" is the Indian seller/shipper. \
 "consignee" is the buyer. "ship_to" is the delivery address (may differ from consignee). \
 "ior" is the Importer of Record. If ship_to is not explicitly labeled, check for \
@@ -71,47 +157,11 @@ INSTRUCTIONS:
 are the same entity, copy the address to both fields.
 
 Return ONLY a valid JSON object (no markdown fences, no commentary) conforming to \
-the exact schema below. Every leaf value must be a {"value": ..., "confidence": ...} \
-object unless it is a list.
+the exact schema below, where every "ADDR" is an address object of this shape:
+ADDR = """ + _compact_json(_ADDRESS_SCHEMA) + """
 
 JSON SCHEMA:
-{
-  "invoice": {
-    "invoice_number": {"value": "...", "confidence": 0.95},
-    "invoice_date": {"value": "...", "confidence": 0.90},
-    "currency": {"value": "USD", "confidence": 0.99},
-    "total_amount": {"value": 12500.00, "confidence": 0.97},
-    "exporter": {
-      "name": {"value": "...", "confidence": 0.9},
-      "address": {"value": "...", "confidence": 0.85},
-      "city": {"value": "...", "confidence": 0.85},
-      "state": {"value": "...", "confidence": 0.85},
-      "zip_code": {"value": "...", "confidence": 0.85},
-      "country": {"value": "...", "confidence": 0.85},
-      "phone": {"value": "...", "confidence": 0.70},
-      "email": {"value": "...", "confidence": 0.70}
-    },
-    "consignee": { "name": {...}, "address": {...}, "city": {...}, "state": {...}, "zip_code": {...}, "country": {...}, "phone": {...}, "email": {...} },
-    "ship_to": { "name": {...}, "address": {...}, "city": {...}, "state": {...}, "zip_code": {...}, "country": {...}, "phone": {...}, "email": {...} },
-    "ior": { "name": {...}, "address": {...}, "city": {...}, "state": {...}, "zip_code": {...}, "country": {...}, "phone": {...}, "email": {...} },
-    "line_items": [
-      {
-        "description": {"value": "...", "confidence": 0.94},
-        "hs_code_origin": {"value": "74181000", "confidence": 0.85},
-        "hs_code_destination": {"value": "74181000", "confidence": 0.80},
-        "quantity": {"value": 500, "confidence": 0.96},
-        "unit_price_usd": {"value": 12.50, "confidence": 0.95},
-        "total_price_usd": {"value": 6250.00, "confidence": 0.97},
-        "unit_weight_kg": {"value": 0.35, "confidence": 0.80},
-        "igst_percent": {"value": 18, "confidence": 0.70},
-        "country_of_origin": {"value": "2-letter ISO code e.g. IN, CN, US. Default IN for Indian exports if not specified", "confidence": 0.0-1.0},
-        "duty_rate": {"value": "customs duty rate percentage if mentioned on invoice, else null", "confidence": 0.0-1.0},
-        "unit_fob_value": {"value": "FOB value per unit in USD if mentioned, else null", "confidence": 0.0-1.0}
-      }
-    ]
-  }
-}
-"""
+""" + _compact_json(_INVOICE_SCHEMA) + "\n"
 
 _PACKING_LIST_PROMPT = """\
 You are extracting packing list data from Indian export shipment documents.
@@ -135,42 +185,7 @@ or any "ship to" / "deliver to" / "consignee" section. If truly absent, use an e
 Return ONLY a valid JSON object (no markdown fences, no commentary).
 
 JSON SCHEMA:
-{
-  "invoice_number": "WFS-042025-26",
-  "exporter_name": "Redplum Pvt Ltd",
-  "consignee_name": "WALMART",
-  "total_boxes": 105,
-  "total_net_weight_kg": 450.5,
-  "total_gross_weight_kg": 520.0,
-  "destinations": [
-    {
-      "id": "D1",
-      "name": "Amazon FBA FTW1",
-      "address": "33333 Lyndon B Johnson Fwy",
-      "city": "Dallas",
-      "state": "TX",
-      "zip_code": "75241",
-      "country": "US",
-      "phone": "",
-      "email": ""
-    }
-  ],
-  "boxes": [
-    {
-      "box_number": 1,
-      "destination_id": "D1",
-      "length_cm": 40,
-      "width_cm": 30,
-      "height_cm": 25,
-      "gross_weight_kg": 5.2,
-      "net_weight_kg": 4.8,
-      "items": [
-        {"description": "Copper Bottle 750ml", "quantity": 10}
-      ]
-    }
-  ]
-}
-"""
+""" + _compact_json(_PACKING_LIST_SCHEMA) + "\n"
 
 _RETRY_PROMPT = """\
 Your previous response was not valid JSON. Please try again.
@@ -184,9 +199,43 @@ set its value to null.
 # ---------------------------------------------------------------------------
 
 
-def _build_text_user_message(pages_data: list[dict[str, Any]], purpose: str) -> str:
-    """Assemble a single user-message string from text-based page data."""
-    parts: list[str] = [f"Extract {purpose} data from the following document pages:\n"]
+def _quote_cell(cell: str, delimiter: str) -> str:
+    """CSV-style quote a cell that contains the delimiter or a double quote."""
+    if delimiter in cell or '"' in cell:
+        return '"' + cell.replace('"', '""') + '"'
+    return cell
+
+
+def _encode_table(table: list[list[str | None]], label: str) -> str:
+    """Encode a page table compactly: column names once, then pipe-delimited rows.
+
+    The first row is taken as the header (``label[n]{col1,col2,...}:``) and
+    columns that are empty in every row are dropped.  Embedded newlines are
+    flattened so each table row stays on a single line, and cells holding
+    the delimiter are quoted so the columns don't shift.
+    """
+    width = max((len(row) for row in table), default=0)
+    rows = [
+        [
+            "" if i >= len(row) or not row[i] else " ".join(row[i].splitlines())
+            for i in range(width)
+        ]
+        for row in table
+    ]
+    keep = [i for i in range(width) if any(row[i] for row in rows)]
+    if not keep:
+        return ""
+
+    header, body = rows[0], rows[1:]
+    columns = ",".join(_quote_cell(header[i] or f"col{i + 1}", ",") for i in keep)
+    lines = [f"{label}[{len(body)}]{{{columns}}}:"]
+    lines.extend("|".join(_quote_cell(row[i], "|") for i in keep) for row in body)
+    return "\n".join(lines)
+
+
+def _build_text_pages(pages_data: list[dict[str, Any]]) -> str:
+    """Assemble the page text + tables portion of a text-based user message."""
+    parts: list[str] = []
 
     for page in pages_data:
         page_num = page.get("page_num", "?")
@@ -197,38 +246,50 @@ def _build_text_user_message(pages_data: list[dict[str, Any]], purpose: str) ->
         if text:
             parts.append(text)
 
-        if tables:
-            for t_idx, table in enumerate(tables):
-                parts.append(f"\n[Table {t_idx + 1} on page {page_num}]")
-                for row in table:
-                    parts.append(" | ".join(str(c) if c else "" for c in row))
+        for t_idx, table in enumerate(tables):
+            encoded = _encode_table(table, f"p{page_num}.table{t_idx + 1}")
+            if encoded:
+                parts.append(encoded)
 
     return "\n".join(parts)
 
 
-def _build_vision_content_blocks(
-    pages_data: list[dict[str, Any]], purpose: str
-) -> list[dict[str, Any]]:
-    """Build Claude content blocks for the vision model."""
-    blocks: list[dict[str, Any]] = []
+def _build_text_user_message(
+    pages_data: list[dict[str, Any]],
+    purpose: str,
+    pages_text: str | None = None,
+) -> str:
+    """Assemble a single user-message string from text-based page data.
+
+    ``pages_text`` is a prebuilt ``_build_text_pages`` result, so callers
+    extracting several purposes from one document assemble the pages once.
+    """
+    header = f"Extract {purpose} data from the following document pages:\n"
+    if pages_text is None:
+        pages_text = _build_text_pages(pages_data)
+    return f"{header}\n{pages_text}" if pages_text else header
+
 
-    blocks.append({
-        "type": "text",
-        "text": f"Extract {purpose} data from the following scanned document pages:",
-    })
+def _build_vision_page_blocks(pages_data: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Build the image + page-label content blocks for the vision model."""
+    blocks: list[dict[str, Any]] = []
 
     for page in pages_data:
         image_bytes: bytes | None = page.get("image_bytes")
         if not image_bytes:
             continue
 
-        b64_data = base64.standard_b64encode(image_bytes).decode("ascii")
+        # process_pdf pre-encodes rendered pages; encode only on a miss
+        b64_data = (
+            page.get("image_b64")
+            or base64.standard_b64encode(image_bytes).decode("ascii")
+        )
         blocks.append(
             {
                 "type": "image",
                 "source": {
                     "type": "base64",
-                    "media_type": "image/png",
+                    "media_type": page.get("image_media_type", "image/png"),
                     "data": b64_data,
                 },
             }
@@ -237,19 +298,85 @@ def _build_vision_content_blocks(
             {"type": "text", "text": f"(Page {page.get('page_num', '?')})"}
         )
 
+    if blocks:
+        # Cache breakpoint after the page images: retries and continuations
+        # resend the same pages and can reuse the cached prefix.
+        blocks[-1]["cache_control"] = {"type": "ephemeral"}
     return blocks
 
 
+def _build_vision_content_blocks(
+    pages_data: list[dict[str, Any]],
+    purpose: str,
+    page_blocks: list[dict[str, Any]] | None = None,
+) -> list[dict[str, Any]]:
+    """Build Claude content blocks for the vision model.
+
+    ``page_blocks`` is a prebuilt ``_build_vision_page_blocks`` result; the
+    block dicts are shared, not copied, between purposes.
+    """
+    if page_blocks is None:
+        page_blocks = _build_vision_page_blocks(pages_data)
+    return [
+        {
+            "type": "text",
+            "text": f"Extract {purpose} data from the following scanned document pages:",
+        },
+        *page_blocks,
+    ]
+
+
+def _build_page_content(
+    pages_data: list[dict[str, Any]], is_vision: bool,
+) -> str | list[dict[str, Any]]:
+    """Purpose-independent page content, shared by the invoice and packing calls."""
+    if is_vision:
+        return _build_vision_page_blocks(pages_data)
+    return _build_text_pages(pages_data)
+
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*\n?(.*?)```", re.DOTALL)
+# Matches a whole string literal or a trailing comma. String literals are
+# consumed first, so commas inside values like "bolts, ]" are left alone.
+_TRAILING_COMMA_RE = re.compile(r'"(?:[^"\\]|\\.)*"|,(\s*[}\]])')
+
+
+def _drop_trailing_comma(m: re.Match[str]) -> str:
+    closer = m.group(1)
+    return m.group(0) if closer is None else closer
+
+
+def _repair_json(text: str) -> str | None:
+    """Cheap local repair for near-miss JSON: surrounding prose, trailing commas."""
+    start = text.find("{")
+    end = text.rfind("}")
+    if start < 0 or end < start:
+        return None
+    return _TRAILING_COMMA_RE.sub(_drop_trailing_comma, text[start:end + 1])
+
+
 def _extract_json_from_response(raw: str) -> dict[str, Any]:
-    """Parse JSON from a Claude response, tolerating markdown fences."""
+    """Parse JSON from a Claude response, tolerating fences and minor damage."""
     text = raw.strip()
 
-    # Strip markdown code fences if present.
-    fence_match = re.search(r"```(?:json)?\s*\n?(.*?)```", text, re.DOTALL)
-    if fence_match:
-        text = fence_match.group(1).strip()
-
-    return json.loads(text)
+    # The prompts ask for bare JSON, so try that before looking for fences.
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers'
+    # retry handling is unchanged.
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError as err:
+        fence_match = _FENCE_RE.search(text)
+        if fence_match:
+            text = fence_match.group(1).strip()
+            try:
+                return orjson.loads(text)
+            except orjson.JSONDecodeError:
+                pass
+        repaired = _repair_json(text)
+        if repaired is None:
+            raise err
+
+    return orjson.loads(repaired)
 
 
 # ---------------------------------------------------------------------------
@@ -280,53 +407,93 @@ def _wrap_flat_value(raw: Any, default_confidence: float = 0.8) -> ConfidenceVal
     return ConfidenceValue(value=raw, confidence=default_confidence)
 
 
-def _parse_address(raw: Any) -> Address:
-    if not raw or not isinstance(raw, dict):
-        return Address()
-    return Address(
-        name=_parse_confidence_value(raw.get("name")),
-        address=_parse_confidence_value(raw.get("address")),
-        city=_parse_confidence_value(raw.get("city")),
-        state=_parse_confidence_value(raw.get("state")),
-        zip_code=_parse_confidence_value(raw.get("zip_code")),
-        country=_parse_confidence_value(raw.get("country")),
-        phone=_parse_confidence_value(raw.get("phone")),
-        email=_parse_confidence_value(raw.get("email")),
-    )
+def _section_confidence(raw: dict[str, Any], default: float = 0.8) -> float:
+    """Read the per-object ``confidence`` of a flat schema section, if present."""
+    conf = raw.get("confidence")
+    if isinstance(conf, (int, float)) and not isinstance(conf, bool):
+        return float(conf)
+    return default
 
 
 def _parse_flat_address(raw: Any) -> Address:
-    """Parse an address from the flat packing list schema (no confidence wrappers)."""
+    """Parse an address from the flat schema (no confidence wrappers)."""
     if not raw or not isinstance(raw, dict):
         return Address()
+    conf = _section_confidence(raw)
     return Address(
-        name=_wrap_flat_value(raw.get("name")),
-        address=_wrap_flat_value(raw.get("address")),
-        city=_wrap_flat_value(raw.get("city")),
-        state=_wrap_flat_value(raw.get("state")),
-        zip_code=_wrap_flat_value(raw.get("zip_code")),
-        country=_wrap_flat_value(raw.get("country")),
-        phone=_wrap_flat_value(raw.get("phone")),
-        email=_wrap_flat_value(raw.get("email")),
+        name=_wrap_flat_value(raw.get("name"), conf),
+        address=_wrap_flat_value(raw.get("address"), conf),
+        city=_wrap_flat_value(raw.get("city"), conf),
+        state=_wrap_flat_value(raw.get("state"), conf),
+        zip_code=_wrap_flat_value(raw.get("zip_code"), conf),
+        country=_wrap_flat_value(raw.get("country"), conf),
+        phone=_wrap_flat_value(raw.get("phone"), conf),
+        email=_wrap_flat_value(raw.get("email"), conf),
     )
 
 
-def _parse_line_item(raw: dict[str, Any]) -> LineItem:
+def _parse_flat_line_item(raw: dict[str, Any]) -> LineItem:
+    """Parse a line item from the flat invoice schema."""
+    conf = _section_confidence(raw)
     return LineItem(
-        description=_parse_confidence_value(raw.get("description")),
-        hs_code_origin=_parse_confidence_value(raw.get("hs_code_origin")),
-        hs_code_destination=_parse_confidence_value(raw.get("hs_code_destination")),
-        quantity=_parse_confidence_value(raw.get("quantity")),
-        unit_price_usd=_parse_confidence_value(raw.get("unit_price_usd")),
-        total_price_usd=_parse_confidence_value(raw.get("total_price_usd")),
-        unit_weight_kg=_parse_confidence_value(raw.get("unit_weight_kg")),
-        igst_percent=_parse_confidence_value(raw.get("igst_percent")),
-        country_of_origin=_parse_confidence_value(raw.get("country_of_origin")),
-        duty_rate=_parse_confidence_value(raw.get("duty_rate")),
-        unit_fob_value=_parse_confidence_value(raw.get("unit_fob_value")),
+        description=_wrap_flat_value(raw.get("description"), conf),
+        hs_code_origin=_wrap_flat_value(raw.get("hs_code_origin"), conf),
+        hs_code_destination=_wrap_flat_value(raw.get("hs_code_destination"), conf),
+        quantity=_wrap_flat_value(raw.get("quantity"), conf),
+        unit_price_usd=_wrap_flat_value(raw.get("unit_price_usd"), conf),
+        total_price_usd=_wrap_flat_value(raw.get("total_price_usd"), conf),
+        unit_weight_kg=_wrap_flat_value(raw.get("unit_weight_kg"), conf),
+        igst_percent=_wrap_flat_value(raw.get("igst_percent"), conf),
+        country_of_origin=_wrap_flat_value(raw.get("country_of_origin"), conf),
+        duty_rate=_wrap_flat_value(raw.get("duty_rate"), conf),
+        unit_fob_value=_wrap_flat_value(raw.get("unit_fob_value"), conf),
     )
 
 
+def _wrap_flat_section(raw: dict[str, Any], skip: tuple[str, ...] = ()) -> dict[str, Any]:
+    """Re-wrap one flat schema section as ``{"value", "confidence"}`` leaves.
+
+    The section's own ``confidence`` is applied to each of its fields; keys in
+    ``skip`` (nested sections) and already-wrapped values are copied through.
+    """
+    conf = _section_confidence(raw)
+    out: dict[str, Any] = {}
+    for key, value in raw.items():
+        if key == "confidence":
+            continue
+        if key in skip or (isinstance(value, dict) and "value" in value):
+            out[key] = value
+        elif value is None:
+            out[key] = {"value": None, "confidence": 0.0}
+        else:
+            out[key] = {"value": value, "confidence": conf}
+    return out
+
+
+def _wrap_invoice_json(data: dict[str, Any]) -> dict[str, Any]:
+    """Convert flat invoice JSON to the confidence-wrapped shape.
+
+    The draft builder and ``_estimate_confidence`` in the agent router read
+    ``{"value", "confidence"}`` leaves, so the per-section confidences of the
+    flat schema are pushed down onto every field.
+    """
+    invoice = data.get("invoice", data)
+    if not isinstance(invoice, dict):
+        return data
+    wrapped = _wrap_flat_section(invoice, skip=_INVOICE_ROLES + ("line_items",))
+    for role in _INVOICE_ROLES:
+        addr = invoice.get(role)
+        if isinstance(addr, dict):
+            wrapped[role] = _wrap_flat_section(addr)
+    items = invoice.get("line_items")
+    if isinstance(items, list):
+        wrapped["line_items"] = [
+            _wrap_flat_section(item) if isinstance(item, dict) else item
+            for item in items
+        ]
+    return {"invoice": wrapped}
+
+
 def _parse_box_item(raw: dict[str, Any]) -> BoxItem:
     return BoxItem(
         description=_parse_confidence_value(raw.get("description")),
@@ -356,36 +523,39 @@ def _parse_box(raw: dict[str, Any]) -> Box:
     )
 
 
+_FLAT_BOX_FIELDS = (
+    "box_number", "length_cm", "width_cm", "height_cm",
+    "gross_weight_kg", "net_weight_kg", "destination_id",
+)
+
+
 def _parse_flat_box(raw: dict[str, Any]) -> Box:
     """Parse a box from the flat packing list schema (no confidence wrappers)."""
     items_raw = raw.get("items") or []
+    get = raw.get
     return Box(
-        box_number=_wrap_flat_value(raw.get("box_number")),
-        length_cm=_wrap_flat_value(raw.get("length_cm")),
-        width_cm=_wrap_flat_value(raw.get("width_cm")),
-        height_cm=_wrap_flat_value(raw.get("height_cm")),
-        gross_weight_kg=_wrap_flat_value(raw.get("gross_weight_kg")),
-        net_weight_kg=_wrap_flat_value(raw.get("net_weight_kg")),
         items=[_parse_flat_box_item(i) for i in items_raw if isinstance(i, dict)],
-        destination_id=_wrap_flat_value(raw.get("destination_id")),
+        **{f: _wrap_flat_value(get(f)) for f in _FLAT_BOX_FIELDS},
     )
 
 
 def _parse_invoice(raw: dict[str, Any] | None) -> InvoiceData:
+    """Parse invoice data from the flat schema (one confidence per section)."""
     if not raw or not isinstance(raw, dict):
         return InvoiceData()
 
+    conf = _section_confidence(raw)
     line_items_raw = raw.get("line_items") or []
     return InvoiceData(
-        invoice_number=_parse_confidence_value(raw.get("invoice_number")),
-        invoice_date=_parse_confidence_value(raw.get("invoice_date")),
-        currency=_parse_confidence_value(raw.get("currency")),
-        total_amount=_parse_confidence_value(raw.get("total_amount")),
-        exporter=_parse_address(raw.get("exporter")),
-        consignee=_parse_address(raw.get("consignee")),
-        ship_to=_parse_address(raw.get("ship_to")),
-        ior=_parse_address(raw.get("ior")),
-        line_items=[_parse_line_item(li) for li in line_items_raw if isinstance(li, dict)],
+        invoice_number=_wrap_flat_value(raw.get("invoice_number"), conf),
+        invoice_date=_wrap_flat_value(raw.get("invoice_date"), conf),
+        currency=_wrap_flat_value(raw.get("currency"), conf),
+        total_amount=_wrap_flat_value(raw.get("total_amount"), conf),
+        exporter=_parse_flat_address(raw.get("exporter")),
+        consignee=_parse_flat_address(raw.get("consignee")),
+        ship_to=_parse_flat_address(raw.get("ship_to")),
+        ior=_parse_flat_address(raw.get("ior")),
+        line_items=[_parse_flat_line_item(li) for li in line_items_raw if isinstance(li, dict)],
     )
 
 
@@ -432,61 +602,82 @@ def _parse_flat_packing_list(raw: dict[str, Any] | None) -> PackingListData:
 def _resolve_box_receivers(
     packing_list: PackingListData,
     fallback_receiver: Address,
-) -> None:
+) -> set[str]:
     """Resolve each box's receiver address from destinations.
 
     Mutates boxes in-place, setting ``box.receiver`` to the matching
     destination address, or the fallback (ship_to / consignee) if no match.
+    Returns the destination IDs referenced by boxes that matched no
+    destination.
     """
-    dest_map: dict[str, Address] = {}
-    for dest in packing_list.destinations:
-        dest_map[dest.id] = dest.address
+    dest_map: dict[str, Address] = {d.id: d.address for d in packing_list.destinations}
+    unresolved: set[str] = set()
 
     for box in packing_list.boxes:
         dest_id = box.destination_id.value
-        if dest_id and str(dest_id) in dest_map:
-            box.receiver = dest_map[str(dest_id)]
-        else:
+        if not dest_id:
+            box.receiver = fallback_receiver
+            continue
+        key = str(dest_id)
+        address = dest_map.get(key)
+        if address is None:
+            unresolved.add(key)
             box.receiver = fallback_receiver
+        else:
+            box.receiver = address
 
+    return unresolved
 
-def _compute_overall_confidence(result: ExtractionResult) -> float:
-    """Compute a weighted average confidence across all extracted fields."""
-    confidences: list[float] = []
 
-    # Invoice-level fields
+def _iter_scored_values(result: ExtractionResult) -> Iterator[ConfidenceValue]:
+    """Yield the ConfidenceValues that contribute to the overall confidence."""
     inv = result.invoice
-    for cv in [inv.invoice_number, inv.invoice_date, inv.currency, inv.total_amount]:
-        if cv.value is not None:
-            confidences.append(cv.confidence)
+    pl = result.packing_list
+
+    # Invoice-level fields
+    yield from (inv.invoice_number, inv.invoice_date, inv.currency, inv.total_amount)
 
     # Line items
     for li in inv.line_items:
-        for cv in [li.description, li.quantity, li.unit_price_usd, li.total_price_usd]:
-            if cv.value is not None:
-                confidences.append(cv.confidence)
+        yield from (li.description, li.quantity, li.unit_price_usd, li.total_price_usd)
 
     # Packing list
-    pl = result.packing_list
-    for cv in [pl.total_boxes, pl.total_net_weight_kg, pl.total_gross_weight_kg]:
-        if cv.value is not None:
-            confidences.append(cv.confidence)
+    yield from (pl.total_boxes, pl.total_net_weight_kg, pl.total_gross_weight_kg)
 
     for box in pl.boxes:
-        for cv in [box.box_number, box.gross_weight_kg, box.net_weight_kg]:
-            if cv.value is not None:
-                confidences.append(cv.confidence)
+        yield from (box.box_number, box.gross_weight_kg, box.net_weight_kg)
 
+
+def _compute_overall_confidence(result: ExtractionResult) -> float:
+    """Compute a weighted average confidence across all extracted fields."""
+    confidences = [cv.confidence for cv in _iter_scored_values(result) if cv.value is not None]
     if not confidences:
         return 0.0
-    return round(sum(confidences) / len(confidences), 3)
+    return round(fmean(confidences), 3)
 
 
 # ---------------------------------------------------------------------------
-# Core LLM calls (synchronous, to be run in executor)
+# Core LLM calls
 # ---------------------------------------------------------------------------
 
 
+@lru_cache(maxsize=32)
+def _build_system_prompt(base_prompt: str, correction_hints: str = "") -> str:
+    """Append correction hints to a base prompt, reusing the result per hint set."""
+    if not correction_hints:
+        return base_prompt
+    return f"{base_prompt}\n\nCommon corrections to watch for:\n{correction_hints}"
+
+
+def _cached_system(system_prompt: str) -> list[dict[str, Any]]:
+    """System prompt as a cacheable block.
+
+    The prompts are static per call type, so retries and continuations (and
+    back-to-back extractions) read them from Anthropic's prompt cache.
+    """
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+
 def _extended_output_headers(max_tokens: int) -> dict[str, str]:
     """Return extra headers needed for extended output (>16K tokens)."""
     if max_tokens > 16384:
@@ -494,41 +685,41 @@ def _extended_output_headers(max_tokens: int) -> dict[str, str]:
     return {}
 
 
-def _call_llm(
-    model: str,
-    system_prompt: str,
-    user_content: str | list[dict[str, Any]],
-    max_tokens: int,
-) -> str:
-    """Generic synchronous LLM call."""
-    response = _client.messages.create(
-        model=model,
-        max_tokens=max_tokens,
-        system=system_prompt,
-        messages=[{"role": "user", "content": user_content}],
-        extra_headers=_extended_output_headers(max_tokens),
-    )
-    return response.content[0].text
+# Prefilling the assistant turn forces the first output token into the JSON
+# object, so responses never open with prose or a markdown fence.
+_JSON_PREFILL = "{"
+
 
+def _prefilled_messages(user_content: str | list[dict[str, Any]]) -> list[dict[str, Any]]:
+    return [
+        {"role": "user", "content": user_content},
+        {"role": "assistant", "content": _JSON_PREFILL},
+    ]
 
-def _call_llm_with_stop(
+
+async def _call_llm_with_stop(
     model: str,
     system_prompt: str,
     user_content: str | list[dict[str, Any]],
     max_tokens: int,
 ) -> tuple[str, str]:
-    """LLM call that also returns the stop_reason."""
-    response = _client.messages.create(
+    """Prefilled, streamed LLM call that also returns the stop_reason.
+
+    Streaming keeps the connection active for the whole of a long
+    packing-list generation instead of idling on one large response body.
+    """
+    async with _client.messages.stream(
         model=model,
         max_tokens=max_tokens,
-        system=system_prompt,
-        messages=[{"role": "user", "content": user_content}],
+        system=_cached_system(system_prompt),
+        messages=_prefilled_messages(user_content),
         extra_headers=_extended_output_headers(max_tokens),
-    )
-    return response.content[0].text, response.stop_reason
+    ) as stream:
+        response = await stream.get_final_message()
+    return _JSON_PREFILL + response.content[0].text, response.stop_reason
 
 
-def _call_continuation(
+async def _call_continuation(
     model: str,
     system_prompt: str,
     original_message: str | list[dict[str, Any]],
@@ -548,17 +739,17 @@ def _call_continuation(
             ),
         },
     ]
-    response = _client.messages.create(
+    response = await _client.messages.create(
         model=model,
         max_tokens=max_tokens,
-        system=system_prompt,
+        system=_cached_system(system_prompt),
         messages=messages,
         extra_headers=_extended_output_headers(max_tokens),
     )
     return response.content[0].text, response.stop_reason
 
 
-def _call_retry(
+async def _call_retry(
     model: str,
     system_prompt: str,
     original_message: Any,
@@ -573,10 +764,10 @@ def _call_retry(
         },
         {"role": "user", "content": _RETRY_PROMPT},
     ]
-    response = _client.messages.create(
+    response = await _client.messages.create(
         model=model,
         max_tokens=max_tokens,
-        system=system_prompt,
+        system=_cached_system(system_prompt),
         messages=messages,
         extra_headers=_extended_output_headers(max_tokens),
     )
@@ -588,95 +779,88 @@ def _call_retry(
 # ---------------------------------------------------------------------------
 
 
-async def _extract_invoice(
-    pages_data: list[dict[str, Any]],
-    is_vision: bool,
-    correction_hints: str = "",
-) -> dict[str, Any]:
-    """Call 1: Extract invoice data (line items, addresses, amounts)."""
-    loop = asyncio.get_running_loop()
-
-    if is_vision:
-        user_content: str | list[dict[str, Any]] = _build_vision_content_blocks(
-            pages_data, "invoice"
-        )
-        model = LLM_MODEL_VISION
-    else:
-        user_content = _build_text_user_message(pages_data, "invoice")
-        model = LLM_MODEL_TEXT
-
-    system_prompt = _INVOICE_PROMPT
-    if correction_hints:
-        system_prompt += f"\n\nCommon corrections to watch for:\n{correction_hints}"
-
-    raw_response = await loop.run_in_executor(
-        None,
-        partial(_call_llm, model, system_prompt, user_content, LLM_MAX_TOKENS_INVOICE),
-    )
-    logger.info("Invoice LLM response: %d chars from %s", len(raw_response), model)
-
-    try:
-        return _extract_json_from_response(raw_response)
-    except (json.JSONDecodeError, ValueError) as first_err:
-        logger.warning("Invoice JSON parse failed (%s), retrying", first_err)
-        retry_response = await loop.run_in_executor(
-            None,
-            partial(_call_retry, model, system_prompt, user_content, LLM_MAX_TOKENS_INVOICE),
-        )
-        return _extract_json_from_response(retry_response)
+@dataclass(frozen=True, slots=True)
+class _ExtractionKind:
+    """Per-document-type settings for the shared extraction coroutine."""
+
+    label: str
+    purpose: str
+    prompt: str
+    text_model: str
+    vision_model: str
+    max_tokens: int
+    max_continuations: int
+
+
+_KIND_CONFIG: dict[str, _ExtractionKind] = {
+    # Call 1: line items, addresses, amounts
+    "invoice": _ExtractionKind(
+        label="Invoice",
+        purpose="invoice",
+        prompt=_INVOICE_PROMPT,
+        text_model=LLM_MODEL_TEXT,
+        vision_model=LLM_MODEL_VISION,
+        max_tokens=LLM_MAX_TOKENS_INVOICE,
+        max_continuations=0,
+    ),
+    # Call 2: destinations + all boxes. Always the higher-capacity model,
+    # with automatic continuation when a large list hits max_tokens.
+    "packing_list": _ExtractionKind(
+        label="Packing list",
+        purpose="packing list",
+        prompt=_PACKING_LIST_PROMPT,
+        text_model=LLM_MODEL_PACKING_LIST,
+        vision_model=LLM_MODEL_PACKING_LIST,
+        max_tokens=LLM_MAX_TOKENS_PACKING_LIST,
+        max_continuations=3,
+    ),
+}
 
 
-async def _extract_packing_list(
+async def _extract(
+    kind: Literal["invoice", "packing_list"],
     pages_data: list[dict[str, Any]],
     is_vision: bool,
     correction_hints: str = "",
+    page_content: str | list[dict[str, Any]] | None = None,
 ) -> dict[str, Any]:
-    """Call 2: Extract packing list data (destinations + all boxes, flat schema).
+    """Run one extraction call and return its parsed JSON.
 
-    Uses extended output tokens and automatic continuation when the response
-    is truncated (stop_reason == "max_tokens") to handle large packing lists
-    with many individual boxes.
+    ``page_content`` is an optional prebuilt ``_build_page_content`` result.
+    Truncated responses (stop_reason == "max_tokens") are continued up to the
+    kind's ``max_continuations``; unparseable output gets one retry.
     """
-    loop = asyncio.get_running_loop()
-
-    # Packing list always uses the higher-capacity model
+    cfg = _KIND_CONFIG[kind]
     if is_vision:
         user_content: str | list[dict[str, Any]] = _build_vision_content_blocks(
-            pages_data, "packing list"
+            pages_data, cfg.purpose, page_content,
         )
+        model = cfg.vision_model
     else:
-        user_content = _build_text_user_message(pages_data, "packing list")
-
-    model = LLM_MODEL_PACKING_LIST
+        user_content = _build_text_user_message(pages_data, cfg.purpose, page_content)
+        model = cfg.text_model
 
-    system_prompt = _PACKING_LIST_PROMPT
-    if correction_hints:
-        system_prompt += f"\n\nCommon corrections to watch for:\n{correction_hints}"
+    system_prompt = _build_system_prompt(cfg.prompt, correction_hints)
 
-    raw_response, stop_reason = await loop.run_in_executor(
-        None,
-        partial(_call_llm_with_stop, model, system_prompt, user_content, LLM_MAX_TOKENS_PACKING_LIST),
+    raw_response, stop_reason = await _call_llm_with_stop(
+        model, system_prompt, user_content, cfg.max_tokens,
     )
     logger.info(
-        "Packing list LLM response: %d chars from %s (stop=%s)",
-        len(raw_response), model, stop_reason,
+        "%s LLM response: %d chars from %s (stop=%s)",
+        cfg.label, len(raw_response), model, stop_reason,
     )
 
     # Handle truncation — continue until the response is complete
-    max_continuations = 3
     continuation_count = 0
-    while stop_reason == "max_tokens" and continuation_count < max_continuations:
+    while stop_reason == "max_tokens" and continuation_count < cfg.max_continuations:
         continuation_count += 1
         logger.warning(
-            "Packing list response truncated (max_tokens), requesting continuation %d/%d",
-            continuation_count, max_continuations,
+            "%s response truncated (max_tokens), requesting continuation %d/%d",
+            cfg.label, continuation_count, cfg.max_continuations,
         )
-        cont_text, stop_reason = await loop.run_in_executor(
-            None,
-            partial(
-                _call_continuation, model, system_prompt, user_content,
-                raw_response, LLM_MAX_TOKENS_PACKING_LIST,
-            ),
+        cont_text, stop_reason = await _call_continuation(
+            model, system_prompt, user_content,
+            raw_response, cfg.max_tokens,
         )
         raw_response += cont_text
         logger.info(
@@ -687,22 +871,44 @@ async def _extract_packing_list(
     try:
         return _extract_json_from_response(raw_response)
     except (json.JSONDecodeError, ValueError) as first_err:
-        logger.warning("Packing list JSON parse failed (%s), retrying", first_err)
-        retry_response = await loop.run_in_executor(
-            None,
-            partial(_call_retry, model, system_prompt, user_content, LLM_MAX_TOKENS_PACKING_LIST),
+        logger.warning("%s JSON parse and repair failed (%s), retrying", cfg.label, first_err)
+        retry_response = await _call_retry(
+            model, system_prompt, user_content, cfg.max_tokens,
         )
         return _extract_json_from_response(retry_response)
 
 
+async def _extract_invoice(
+    pages_data: list[dict[str, Any]],
+    is_vision: bool,
+    correction_hints: str = "",
+    page_content: str | list[dict[str, Any]] | None = None,
+) -> dict[str, Any]:
+    """Call 1: Extract invoice data (line items, addresses, amounts).
+
+    Returned in the confidence-wrapped shape the agent router expects.
+    """
+    data = await _extract("invoice", pages_data, is_vision, correction_hints, page_content)
+    return _wrap_invoice_json(data)
+
+
+async def _extract_packing_list(
+    pages_data: list[dict[str, Any]],
+    is_vision: bool,
+    correction_hints: str = "",
+    page_content: str | list[dict[str, Any]] | None = None,
+) -> dict[str, Any]:
+    """Call 2: Extract packing list data (destinations + all boxes, flat schema)."""
+    return await _extract("packing_list", pages_data, is_vision, correction_hints, page_content)
+
+
 def _merge_results(
-    invoice_data: dict[str, Any],
+    invoice: InvoiceData,
     packing_data: dict[str, Any],
 ) -> ExtractionResult:
-    """Merge invoice and packing list LLM outputs into a single ExtractionResult."""
+    """Merge the parsed invoice and packing list LLM output into an ExtractionResult."""
     warnings: list[str] = []
 
-    invoice = _parse_invoice(invoice_data.get("invoice"))
     packing_list = _parse_flat_packing_list(packing_data)
 
     # Determine fallback receiver for boxes without a destination match
@@ -713,16 +919,8 @@ def _merge_results(
     ):
         fallback = invoice.consignee
 
-    # Resolve per-box receiver addresses
-    _resolve_box_receivers(packing_list, fallback)
-
-    # Check for unresolved destination IDs
-    dest_ids = {d.id for d in packing_list.destinations}
-    unresolved = set()
-    for box in packing_list.boxes:
-        did = box.destination_id.value
-        if did and str(did) not in dest_ids:
-            unresolved.add(str(did))
+    # Resolve per-box receiver addresses, collecting unknown destination IDs
+    unresolved = _resolve_box_receivers(packing_list, fallback)
     if unresolved:
         warnings.append(
             f"Boxes reference unknown destination IDs: {', '.join(sorted(unresolved))}"
@@ -748,6 +946,25 @@ def _merge_results(
 # ---------------------------------------------------------------------------
 
 
+async def _skipped_extraction() -> dict[str, Any]:
+    """Stand-in for an extraction call the document type makes unnecessary."""
+    return {}
+
+
+async def _extract_invoice_model(
+    pages_data: list[dict[str, Any]],
+    is_vision: bool,
+    page_content: str | list[dict[str, Any]] | None = None,
+) -> InvoiceData:
+    """Run the invoice call and map it onto the model as soon as it returns.
+
+    The invoice call finishes well before the packing-list generation, so
+    its parsing overlaps the packing list still streaming in.
+    """
+    invoice_data = await _extract("invoice", pages_data, is_vision, page_content=page_content)
+    return _parse_invoice(invoice_data.get("invoice"))
+
+
 async def extract_from_text(
     pages_data: list[dict[str, Any]],
     doc_type: str = "AUTO",
@@ -765,8 +982,8 @@ async def extract_from_text(
         Each dict has ``page_num``, ``text``, ``tables``, ``image_bytes``.
     doc_type:
         One of ``"INVOICE"``, ``"PACKING_LIST"``, ``"COMBINED"``, or ``"AUTO"``
-        (auto-detect). Kept for API compatibility but both calls always
-        receive all pages.
+        (auto-detect). ``"INVOICE"`` and ``"PACKING_LIST"`` skip the other
+        call entirely; the remaining types run both calls on all pages.
 
     Returns
     -------
@@ -782,31 +999,42 @@ async def extract_from_text(
         )
 
     is_vision = any(p.get("image_bytes") for p in pages_data)
+    # Both calls send the same pages; assemble them once
+    page_content = _build_page_content(pages_data, is_vision)
+
+    # A caller that already knows the document type only pays for one call.
+    want_invoice = doc_type != "PACKING_LIST"
+    want_packing = doc_type != "INVOICE"
 
-    # Run both extractions concurrently; return_exceptions=True so one
+    # Run the extractions concurrently; return_exceptions=True so one
     # failure doesn't discard the other's result.
     results = await asyncio.gather(
-        _extract_invoice(pages_data, is_vision),
-        _extract_packing_list(pages_data, is_vision),
+        _extract_invoice_model(pages_data, is_vision, page_content=page_content)
+        if want_invoice else _skipped_extraction(),
+        _extract("packing_list", pages_data, is_vision, page_content=page_content)
+        if want_packing else _skipped_extraction(),
         return_exceptions=True,
     )
 
-    invoice_data: dict[str, Any] | Exception = results[0]
+    invoice: InvoiceData | dict[str, Any] | Exception = results[0]
     packing_data: dict[str, Any] | Exception = results[1]
     gather_errors: list[str] = []
 
-    if isinstance(invoice_data, Exception):
-        logger.exception("Invoice extraction failed: %s", invoice_data)
-        gather_errors.append(f"Invoice extraction failed: {invoice_data}")
-        invoice_data = {}
+    if isinstance(invoice, Exception):
+        logger.exception("Invoice extraction failed: %s", invoice)
+        gather_errors.append(f"Invoice extraction failed: {invoice}")
+        invoice = InvoiceData()
+    elif not isinstance(invoice, InvoiceData):
+        # Skipped for a packing-list-only document
+        invoice = InvoiceData()
 
     if isinstance(packing_data, Exception):
         logger.exception("Packing list extraction failed: %s", packing_data)
         gather_errors.append(f"Packing list extraction failed: {packing_data}")
         packing_data = {}
 
-    # If both calls failed, return early with a clear error
-    if len(gather_errors) == 2:
+    # If every call that ran failed, return early with a clear error
+    if len(gather_errors) == want_invoice + want_packing:
         return ExtractionResult(
             status="failed",
             errors=gather_errors,
@@ -816,7 +1044,9 @@ async def extract_from_text(
     # Merge results from both calls
     # ------------------------------------------------------------------
     try:
-        result = _merge_results(invoice_data, packing_data)
+        # Mapping hundreds of boxes onto pydantic models is CPU-bound; keep
+        # it off the event loop so concurrent extractions keep streaming.
+        result = await asyncio.to_thread(_merge_results, invoice, packing_data)
         # Propagate partial-failure warnings
         if gather_errors:
             result.warnings = gather_errors + result.warnings
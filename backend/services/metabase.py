@@ -7,11 +7,11 @@ from __future__ import annotations
 
 import logging
 import os
-import re
 import time
 from typing import Any
 
 import httpx
+import orjson
 
 logger = logging.getLogger(__name__)
 
@@ -34,17 +34,41 @@ _BROWSER_HEADERS = {
 }
 
 
+# Shared client so Metabase queries reuse pooled keep-alive connections
+# instead of paying a TCP+TLS handshake per call.
+_http: httpx.AsyncClient | None = None
+
+
+def _get_http() -> httpx.AsyncClient:
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(
+            http2=True,
+            headers=_BROWSER_HEADERS,
+            timeout=15,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+        )
+    return _http
+
+
+async def close_http() -> None:
+    """Close the shared HTTP client (called on application shutdown)."""
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
+
+_SQL_ESCAPE_TABLE = str.maketrans({
+    "\0": "\\0", "\x08": "\\b", "\x09": "\\t", "\x1a": "\\z",
+    "\n": "\\n", "\r": "\\r", '"': '\\"', "'": "\\'",
+    "\\": "\\\\", "%": "\\%", "_": "\\_",
+})
+
+
 def escape_sql(value: str) -> str:
     """Escape a string for safe use in MySQL single-quoted literals."""
-    return re.sub(
-        r"[\0\x08\x09\x1a\n\r\"'\\%_]",
-        lambda m: {
-            "\0": "\\0", "\x08": "\\b", "\x09": "\\t", "\x1a": "\\z",
-            "\n": "\\n", "\r": "\\r", '"': '\\"', "'": "\\'",
-            "\\": "\\\\", "%": "\\%", "_": "\\_",
-        }.get(m.group(), m.group()),
-        value,
-    )
+    return value.translate(_SQL_ESCAPE_TABLE)
 
 
 async def _get_session() -> str:
@@ -60,13 +84,12 @@ async def _get_session() -> str:
             "Set METABASE_URL, METABASE_USERNAME, METABASE_PASSWORD."
         )
 
-    async with httpx.AsyncClient(timeout=15, headers=_BROWSER_HEADERS) as client:
-        res = await client.post(
-            f"{METABASE_URL}/api/session",
-            json={"username": METABASE_USERNAME, "password": METABASE_PASSWORD},
-        )
-        res.raise_for_status()
-        data = res.json()
+    res = await _get_http().post(
+        f"{METABASE_URL}/api/session",
+        json={"username": METABASE_USERNAME, "password": METABASE_PASSWORD},
+    )
+    res.raise_for_status()
+    data = orjson.loads(res.content)
 
     _session_token = data["id"]
     # Metabase sessions last 14 days; refresh after 12
@@ -78,31 +101,30 @@ async def query_metabase(sql: str, _retry: bool = True) -> list[dict[str, Any]]:
     """Execute a native SQL query and return rows as list of dicts."""
     session = await _get_session()
 
-    async with httpx.AsyncClient(timeout=15, headers=_BROWSER_HEADERS) as client:
-        res = await client.post(
-            f"{METABASE_URL}/api/dataset",
-            headers={
-                "Content-Type": "application/json",
-                "X-Metabase-Session": session,
-            },
-            json={
-                "database": METABASE_DB_ID,
-                "type": "native",
-                "native": {"query": sql},
-            },
-        )
+    res = await _get_http().post(
+        f"{METABASE_URL}/api/dataset",
+        headers={
+            "Content-Type": "application/json",
+            "X-Metabase-Session": session,
+        },
+        json={
+            "database": METABASE_DB_ID,
+            "type": "native",
+            "native": {"query": sql},
+        },
+    )
 
-        if not res.is_success:
-            text = res.text
-            is_block = "Cloudflare" in text or "<!DOCTYPE" in text
-            if (res.status_code in (401, 403) or is_block) and _retry:
-                global _session_token, _session_expiry
-                _session_token = None
-                _session_expiry = 0
-                return await query_metabase(sql, _retry=False)
-            raise RuntimeError(f"Metabase query failed ({res.status_code}): {text[:200]}")
+    if not res.is_success:
+        text = res.text
+        is_block = "Cloudflare" in text or "<!DOCTYPE" in text
+        if (res.status_code in (401, 403) or is_block) and _retry:
+            global _session_token, _session_expiry
+            _session_token = None
+            _session_expiry = 0
+            return await query_metabase(sql, _retry=False)
+        raise RuntimeError(f"Metabase query failed ({res.status_code}): {text[:200]}")
 
-        result = res.json()
+    result = orjson.loads(res.content)
 
     if result.get("error"):
         raise RuntimeError(f"Metabase query error: {result['error']}")
@@ -110,5 +132,5 @@ async def query_metabase(sql: str, _retry: bool = True) -> list[dict[str, Any]]:
     cols = result.get("data", {}).get("cols", [])
     rows = result.get("data", {}).get("rows", [])
 
-    col_names = [c["name"] for c in cols]
-    return [{col_names[i]: row[i] for i in range(len(col_names))} for row in rows]
+    col_names = tuple(c["name"] for c in cols)
+    return [dict(zip(col_names, row)) for row in rows]
@@ -6,6 +6,7 @@ text-based PDFs.
 """
 from __future__ import annotations
 
+import base64
 import io
 import logging
 from typing import Any
@@ -18,27 +19,37 @@ logger = logging.getLogger(__name__)
 # Minimum characters per page to consider a PDF "text-based".
 _TEXT_THRESHOLD = 50
 
+# Rendered pages are capped at Claude's native vision size (larger images
+# are downscaled server-side anyway) and sent as JPEG, which is several
+# times smaller than PNG for scanned documents.
+_RENDER_ZOOM = 2.0
+_VISION_MAX_EDGE_PX = 1568
+_JPEG_QUALITY = 85
 
-def _is_text_based(pdf_bytes: bytes) -> bool:
-    """Return True if every page in the PDF contains meaningful text.
+
+def _classify_pdf(pdf_bytes: bytes) -> tuple[bool, fitz.Document | None]:
+    """Return whether every page in the PDF contains meaningful text.
 
     A page is considered text-bearing when its extracted character count
     exceeds ``_TEXT_THRESHOLD``.  If *any* page falls below the threshold
     the entire document is treated as scanned / image-based so that the
-    vision pipeline can handle it.
+    vision pipeline can handle it; the scan stops at that first page.
+
+    The opened document is returned alongside the verdict so a scanned PDF
+    can be rendered without parsing it a second time.  It is ``None`` if
+    the PDF could not be opened, and the caller owns closing it.
     """
+    doc: fitz.Document | None = None
     try:
         doc = fitz.open(stream=pdf_bytes, filetype="pdf")
         for page in doc:
             text = page.get_text("text") or ""
             if len(text.strip()) <= _TEXT_THRESHOLD:
-                doc.close()
-                return False
-        doc.close()
-        return True
+                return False, doc
+        return True, doc
     except Exception:
         logger.exception("Error during text-based detection with PyMuPDF")
-        return False
+        return False, doc
 
 
 def _extract_text_pages(pdf_bytes: bytes) -> list[dict[str, Any]]:
@@ -50,6 +61,7 @@ def _extract_text_pages(pdf_bytes: bytes) -> list[dict[str, Any]]:
             "text": str,
             "tables": list,        # list of tables, each table is list[list[str|None]]
             "image_bytes": None,
+            "image_b64": None,
         }
     """
     pages: list[dict[str, Any]] = []
@@ -79,46 +91,61 @@ def _extract_text_pages(pdf_bytes: bytes) -> list[dict[str, Any]]:
                         "text": page_text,
                         "tables": cleaned_tables,
                         "image_bytes": None,
+                        "image_b64": None,
                     }
                 )
+                # pdfplumber keeps every parsed page's layout objects alive
+                # until the PDF is closed; drop them once the page is done.
+                page.flush_cache()
     except Exception:
         logger.exception("Error extracting text pages with pdfplumber")
 
     return pages
 
 
-def _extract_image_pages(pdf_bytes: bytes) -> list[dict[str, Any]]:
-    """Render each page of a scanned PDF to a PNG image using PyMuPDF.
+def _extract_image_pages(doc: fitz.Document) -> list[dict[str, Any]]:
+    """Render each page of an opened scanned PDF to a JPEG image using PyMuPDF.
+
+    Closes *doc* when done.
 
     Returns a list of page dicts:
         {
-            "page_num": int,       # 1-indexed
+            "page_num": int,          # 1-indexed
             "text": "",
             "tables": [],
-            "image_bytes": bytes,  # PNG image data
+            "image_bytes": bytes,     # JPEG image data
+            "image_b64": str,         # base64 JPEG, shared by classify + extract
+            "image_media_type": str,  # "image/jpeg"
         }
     """
     pages: list[dict[str, Any]] = []
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
         for idx, page in enumerate(doc):
-            # Render at 2x zoom (144 DPI) for legible OCR / vision input.
-            zoom = 2.0
+            # Render at 2x zoom (144 DPI) for legible OCR / vision input,
+            # reduced so the long edge stays within the vision size limit.
+            long_edge = max(page.rect.width, page.rect.height) or 1.0
+            zoom = min(_RENDER_ZOOM, _VISION_MAX_EDGE_PX / long_edge)
             matrix = fitz.Matrix(zoom, zoom)
             pixmap = page.get_pixmap(matrix=matrix)
-            png_bytes: bytes = pixmap.tobytes(output="png")
+            jpeg_bytes: bytes = pixmap.tobytes(output="jpeg", jpg_quality=_JPEG_QUALITY)
+            # Release the raw bitmap now rather than when the next page
+            # rebinds the name.
+            del pixmap
 
             pages.append(
                 {
                     "page_num": idx + 1,
                     "text": "",
                     "tables": [],
-                    "image_bytes": png_bytes,
+                    "image_bytes": jpeg_bytes,
+                    "image_b64": base64.standard_b64encode(jpeg_bytes).decode("ascii"),
+                    "image_media_type": "image/jpeg",
                 }
             )
-        doc.close()
     except Exception:
         logger.exception("Error rendering scanned pages with PyMuPDF")
+    finally:
+        doc.close()
 
     return pages
 
@@ -141,12 +168,14 @@ def process_pdf(file_bytes: bytes) -> dict[str, Any]:
                 ``text``        (str)
                 ``tables``      (list[list[list[str|None]]])
                 ``image_bytes`` (bytes | None)
+                ``image_b64``   (str | None)
+                ``image_media_type`` (str, rendered pages only)
     """
     if not file_bytes:
         logger.warning("process_pdf called with empty file bytes")
         return {"is_text_based": False, "pages": []}
 
-    text_based = _is_text_based(file_bytes)
+    text_based, doc = _classify_pdf(file_bytes)
     logger.info(
         "PDF classification: %s (%d bytes)",
         "text-based" if text_based else "scanned/image",
@@ -154,9 +183,13 @@ def process_pdf(file_bytes: bytes) -> dict[str, Any]:
     )
 
     if text_based:
+        # pdfplumber parses the bytes itself; the MuPDF handle isn't needed
+        doc.close()
         pages = _extract_text_pages(file_bytes)
+    elif doc is not None:
+        pages = _extract_image_pages(doc)
     else:
-        pages = _extract_image_pages(file_bytes)
+        pages = []
 
     logger.info("Extracted %d page(s) from PDF", len(pages))
     return {"is_text_based": text_based, "pages": pages}
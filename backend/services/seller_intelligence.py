@@ -4,12 +4,15 @@ Uses Metabase + Claude Haiku for Xindus customer auto-matching.
 """
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
+import time
 from typing import Any
 from uuid import UUID
 
-from thefuzz import fuzz
+import orjson
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
 
 from backend import db
 from backend.utils import normalize_name
@@ -19,6 +22,18 @@ logger = logging.getLogger(__name__)
 # Fuzzy match threshold for seller name matching (0-100)
 _FUZZY_THRESHOLD = 85
 
+# Scores are rounded to the integer ratios thefuzz produced; this cutoff
+# lets rapidfuzz drop anything that cannot round up to the threshold.
+_FUZZY_CUTOFF = _FUZZY_THRESHOLD - 0.5
+
+# thefuzz's token_set_ratio pre-processing: drop Latin-1 supplement chars,
+# then lowercase and strip non-alphanumerics.
+_LATIN1_DROP = {i: None for i in range(128, 256)}
+
+
+def _token_process(name: str) -> str:
+    return default_process(name.translate(_LATIN1_DROP))
+
 # Fields that are stable across shipments and stored as seller defaults.
 _DEFAULT_FIELDS: list[str] = [
     "shipping_method",
@@ -51,14 +66,72 @@ _DEFAULT_ADDRESS_FIELDS: list[str] = [
 # ---------------------------------------------------------------------------
 
 
+# Seller names for the fuzzy fallback, cached briefly so a batch upload
+# doesn't refetch the whole sellers table per shipment. Only names are
+# cached; a matched seller's row (and defaults) is always read fresh.
+_SELLER_NAMES_TTL_SECONDS = 60
+# (expires_at, normalized names, token-processed names)
+_seller_names: tuple[float, list[str], list[str]] | None = None
+
+
+async def _get_seller_names() -> tuple[list[str], list[str]]:
+    global _seller_names
+    now = time.time()
+    if _seller_names is not None and _seller_names[0] > now:
+        return _seller_names[1], _seller_names[2]
+
+    names = [s.get("normalized_name") or "" for s in await db.get_all_sellers()]
+    token_names = [_token_process(n) for n in names]
+    _seller_names = (now + _SELLER_NAMES_TTL_SECONDS, names, token_names)
+    return names, token_names
+
+
+def _invalidate_seller_names() -> None:
+    global _seller_names
+    _seller_names = None
+
+
+def _best_fuzzy_name(norm: str, names: list[str], token_names: list[str]) -> str | None:
+    """Return the first name with the highest ratio at or above the threshold.
+
+    Both scorers run over all candidates inside rapidfuzz; only candidates
+    clearing the cutoff come back to Python.
+    """
+    scores: dict[int, int] = {}
+    for query, choices, scorer in (
+        (norm, names, fuzz.ratio),
+        (_token_process(norm), token_names, fuzz.token_set_ratio),
+    ):
+        for _, score, idx in process.extract_iter(
+            query, choices, scorer=scorer, score_cutoff=_FUZZY_CUTOFF,
+        ):
+            ratio = round(score)
+            if ratio > scores.get(idx, 0):
+                scores[idx] = ratio
+
+    best_idx: int | None = None
+    best_ratio = 0
+    for idx in sorted(scores):
+        ratio = scores[idx]
+        if ratio >= _FUZZY_THRESHOLD and ratio > best_ratio:
+            best_ratio = ratio
+            best_idx = idx
+    return names[best_idx] if best_idx is not None else None
+
+
 async def match_or_create_seller(
     shipper_name: str,
     shipper_address: dict[str, Any] | None = None,
+    link_in_background: bool = True,
+    link_xindus: bool = True,
 ) -> tuple[UUID, dict[str, Any] | None]:
     """Look up a seller by name, or create a new profile.
 
     Returns (seller_id, defaults_dict_or_None).
     defaults is None for newly-created sellers.
+    The Xindus customer auto-link runs in the background unless
+    ``link_in_background`` is False, in which case it is awaited so the
+    seller row reflects it on return. ``link_xindus=False`` skips it.
     """
     norm = normalize_name(shipper_name)
     if not norm:
@@ -68,29 +141,29 @@ async def match_or_create_seller(
             normalized_name=shipper_name or "UNKNOWN",
             shipper_address=shipper_address,
         )
+        _invalidate_seller_names()
         return seller_id, None
 
     # 1. Exact match on normalized_name
     seller = await db.get_seller_by_normalized_name(norm)
     if seller:
-        await _try_link_xindus_customer(seller["id"], shipper_name, shipper_address)
+        if link_xindus:
+            await _link_xindus_customer(
+                seller["id"], shipper_name, shipper_address, link_in_background,
+            )
         defaults = _parse_jsonb(seller.get("defaults"))
         return seller["id"], defaults if defaults else None
 
     # 2. Fuzzy fallback — scan all sellers (use best of ratio + token_set_ratio)
-    all_sellers = await db.get_all_sellers()
-    best_match: dict[str, Any] | None = None
-    best_ratio = 0
-
-    for s in all_sellers:
-        s_norm = s.get("normalized_name", "")
-        ratio = max(fuzz.ratio(norm, s_norm), fuzz.token_set_ratio(norm, s_norm))
-        if ratio >= _FUZZY_THRESHOLD and ratio > best_ratio:
-            best_ratio = ratio
-            best_match = s
+    names, token_names = await _get_seller_names()
+    best_name = _best_fuzzy_name(norm, names, token_names)
+    best_match = await db.get_seller_by_normalized_name(best_name) if best_name else None
 
     if best_match:
-        await _try_link_xindus_customer(best_match["id"], shipper_name, shipper_address)
+        if link_xindus:
+            await _link_xindus_customer(
+                best_match["id"], shipper_name, shipper_address, link_in_background,
+            )
         defaults = _parse_jsonb(best_match.get("defaults"))
         return best_match["id"], defaults if defaults else None
 
@@ -100,9 +173,13 @@ async def match_or_create_seller(
         normalized_name=norm,
         shipper_address=shipper_address,
     )
+    _invalidate_seller_names()
 
     # ── Auto-match Xindus customer (runs for all paths) ──
-    await _try_link_xindus_customer(seller_id, shipper_name, shipper_address)
+    if link_xindus:
+        await _link_xindus_customer(
+            seller_id, shipper_name, shipper_address, link_in_background,
+        )
 
     return seller_id, None
 
@@ -131,27 +208,27 @@ async def match_xindus_customer(
                 seen_ids.add(rid)
                 all_candidates.append(r)
 
-    # Strategy 1: search with raw name
-    try:
-        _add(await db.search_xindus_customers(seller_name, limit=10))
-    except Exception:
-        logger.warning("Xindus customer search failed (raw)", exc_info=True)
-
-    # Strategy 2: search with normalized name
+    # Search strategies, in priority order:
+    #   1. raw name, 2. normalized name, 3. individual significant words
     norm = normalize_name(seller_name)
+    searches: dict[str, int] = {seller_name: 10}
     if norm and norm != seller_name.upper().strip():
-        try:
-            _add(await db.search_xindus_customers(norm, limit=10))
-        except Exception:
-            pass
-
-    # Strategy 3: search with individual significant words (3+ chars)
-    words = [w for w in norm.split() if len(w) >= 3]
-    for word in words[:3]:
-        try:
-            _add(await db.search_xindus_customers(word, limit=5))
-        except Exception:
-            pass
+        searches.setdefault(norm, 10)
+    for word in [w for w in norm.split() if len(w) >= 3][:3]:
+        searches.setdefault(word, 5)
+
+    # The searches are independent, so run them concurrently; candidates are
+    # still added in strategy order.
+    results = await asyncio.gather(
+        *(db.search_xindus_customers(q, limit=limit) for q, limit in searches.items()),
+        return_exceptions=True,
+    )
+    for i, rows in enumerate(results):
+        if isinstance(rows, Exception):
+            if i == 0:
+                logger.warning("Xindus customer search failed (raw)", exc_info=rows)
+            continue
+        _add(rows)
 
     if not all_candidates:
         return None
@@ -177,6 +254,19 @@ async def match_xindus_customer(
     return int(all_candidates[0]["id"])
 
 
+# One client per process so disambiguation calls reuse the SDK's pooled
+# connections instead of building a new HTTP client each time.
+_anthropic_client: Any = None
+
+
+def _get_anthropic() -> Any:
+    global _anthropic_client
+    if _anthropic_client is None:
+        import anthropic
+        _anthropic_client = anthropic.AsyncAnthropic()
+    return _anthropic_client
+
+
 async def _llm_pick_best_customer(
     seller_name: str,
     shipper_address: dict[str, Any] | None,
@@ -184,8 +274,7 @@ async def _llm_pick_best_customer(
 ) -> int | None:
     """Use Claude Haiku to pick the best Xindus customer from candidates."""
     try:
-        import anthropic
-        client = anthropic.AsyncAnthropic()
+        client = _get_anthropic()
 
         addr_str = ""
         if shipper_address:
@@ -229,7 +318,7 @@ async def _llm_pick_best_customer(
         start = text.find("{")
         end = text.rfind("}") + 1
         if start >= 0 and end > start:
-            parsed = json.loads(text[start:end])
+            parsed = orjson.loads(text[start:end])
             cid = parsed.get("customer_id")
             confidence = parsed.get("confidence", 0)
             if cid is not None and confidence >= 0.6:
@@ -245,6 +334,62 @@ async def _llm_pick_best_customer(
     return None
 
 
+# In-flight auto-link tasks by seller. Holding the task keeps it from being
+# garbage-collected mid-run, and a seller already being linked (e.g. several
+# shipments from one seller in a batch) isn't matched again concurrently.
+_link_tasks: dict[UUID, asyncio.Task[None]] = {}
+
+# Cap on concurrent auto-links (background or awaited): each one runs
+# several Metabase searches and an LLM call.
+_LINK_MAX_CONCURRENCY = 4
+_link_sem = asyncio.Semaphore(_LINK_MAX_CONCURRENCY)
+
+
+def _schedule_xindus_link(
+    seller_id: UUID,
+    seller_name: str,
+    shipper_address: dict[str, Any] | None = None,
+) -> None:
+    """Run the Xindus auto-link in the background, off the ingestion path.
+
+    Linking never changes the seller id or defaults returned to the caller,
+    so ingestion does not need to wait on its searches and LLM call.
+    """
+    if seller_id in _link_tasks:
+        return
+    task = asyncio.create_task(
+        _try_link_xindus_customer(seller_id, seller_name, shipper_address)
+    )
+    _link_tasks[seller_id] = task
+    task.add_done_callback(lambda _: _link_tasks.pop(seller_id, None))
+
+
+async def _link_xindus_customer(
+    seller_id: UUID,
+    seller_name: str,
+    shipper_address: dict[str, Any] | None,
+    in_background: bool,
+) -> None:
+    """Schedule the Xindus auto-link, or await it (joining any in-flight run)."""
+    if in_background:
+        _schedule_xindus_link(seller_id, seller_name, shipper_address)
+        return
+    task = _link_tasks.get(seller_id)
+    if task is not None:
+        await asyncio.shield(task)
+    else:
+        await _try_link_xindus_customer(seller_id, seller_name, shipper_address)
+
+
+async def cancel_link_tasks() -> None:
+    """Cancel in-flight background auto-links (called on application shutdown)."""
+    tasks = list(_link_tasks.values())
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 async def _try_link_xindus_customer(
     seller_id: UUID,
     seller_name: str,
@@ -252,17 +397,18 @@ async def _try_link_xindus_customer(
 ) -> None:
     """Attempt to auto-link a seller to a Xindus customer (idempotent)."""
     try:
-        seller_row = await db.get_seller(seller_id)
-        if seller_row and seller_row.get("xindus_customer_id") is not None:
-            return  # Already linked
-
-        xindus_id = await match_xindus_customer(seller_name, shipper_address)
-        if xindus_id:
-            await db.update_seller_xindus_customer_id(seller_id, xindus_id)
-            logger.info(
-                "Auto-linked seller '%s' (%s) to Xindus customer %d",
-                seller_name, seller_id, xindus_id,
-            )
+        async with _link_sem:
+            seller_row = await db.get_seller(seller_id)
+            if seller_row and seller_row.get("xindus_customer_id") is not None:
+                return  # Already linked
+
+            xindus_id = await match_xindus_customer(seller_name, shipper_address)
+            # Conditional write: a manual link made meanwhile takes precedence
+            if xindus_id and await db.link_seller_xindus_customer_if_unset(seller_id, xindus_id):
+                logger.info(
+                    "Auto-linked seller '%s' (%s) to Xindus customer %d",
+                    seller_name, seller_id, xindus_id,
+                )
     except Exception:
         logger.warning("Xindus customer auto-link failed for '%s'", seller_name, exc_info=True)
 
@@ -382,25 +528,20 @@ def _is_blank(val: Any) -> bool:
     """Check if a value is blank/empty/falsy (but 0 and False are valid)."""
     if val is None:
         return True
-    if isinstance(val, str) and not val.strip():
-        return True
-    if isinstance(val, dict) and not val:
-        return True
-    if isinstance(val, list) and not val:
-        return True
-    return False
+    if isinstance(val, str):
+        return not val.strip()
+    return isinstance(val, (dict, list)) and not val
 
 
 def _parse_jsonb(val: Any) -> dict[str, Any] | None:
     """Parse a JSONB value that may be a string or already a dict."""
-    import json
     if val is None:
         return None
     if isinstance(val, dict):
         return val
     if isinstance(val, str):
         try:
-            return json.loads(val)
-        except (json.JSONDecodeError, TypeError):
+            return orjson.loads(val)
+        except orjson.JSONDecodeError:
             return None
     return None
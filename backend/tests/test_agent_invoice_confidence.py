@@ -0,0 +1,107 @@
+"""Invoice confidence on the agent extraction path.
+
+The invoice LLM returns the flat schema (one ``confidence`` per section);
+``_extract_invoice`` must hand the agent router ``{"value", "confidence"}``
+leaves so the draft builder and ``_estimate_confidence`` see real scores.
+"""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("anthropic")
+pytest.importorskip("fastapi")
+
+from backend.routers import agent  # noqa: E402
+from backend.services import llm_extractor  # noqa: E402
+from backend.services.draft_builder import build_draft_shipment  # noqa: E402
+
+FLAT_INVOICE = {
+    "invoice": {
+        "confidence": 0.95,
+        "invoice_number": "WFS-042025-26",
+        "invoice_date": "2025-04-02",
+        "currency": "USD",
+        "total_amount": 6250.0,
+        "exporter": {
+            "confidence": 0.9,
+            "name": "Redplum Pvt Ltd",
+            "address": "12 MG Road",
+            "city": "Jaipur",
+            "state": "RJ",
+            "zip_code": "302001",
+            "country": "IN",
+            "phone": None,
+            "email": None,
+        },
+        "consignee": {
+            "confidence": 0.85,
+            "name": "Walmart",
+            "address": "702 SW 8th St",
+            "city": "Bentonville",
+            "state": "AR",
+            "zip_code": "72716",
+            "country": "US",
+            "phone": None,
+            "email": None,
+        },
+        "ship_to": None,
+        "ior": None,
+        "line_items": [
+            {
+                "confidence": 0.8,
+                "description": "Copper bottle",
+                "hs_code_origin": "74181000",
+                "hs_code_destination": "74181000",
+                "quantity": 500,
+                "unit_price_usd": 12.5,
+                "total_price_usd": 6250.0,
+                "unit_weight_kg": 0.35,
+                "igst_percent": 18,
+                "country_of_origin": "IN",
+                "duty_rate": None,
+                "unit_fob_value": None,
+            }
+        ],
+    }
+}
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    async def fake_extract(kind, *args, **kwargs):
+        assert kind == "invoice"
+        return FLAT_INVOICE
+
+    monkeypatch.setattr(llm_extractor, "_extract", fake_extract)
+    return asyncio.run(llm_extractor._extract_invoice([], False))
+
+
+def test_extract_invoice_wraps_flat_fields(extracted):
+    invoice = extracted["invoice"]
+    assert invoice["invoice_number"] == {"value": "WFS-042025-26", "confidence": 0.95}
+    assert invoice["exporter"]["city"] == {"value": "Jaipur", "confidence": 0.9}
+    assert invoice["exporter"]["phone"] == {"value": None, "confidence": 0.0}
+    assert invoice["ship_to"] is None
+    assert invoice["line_items"][0]["quantity"] == {"value": 500, "confidence": 0.8}
+    assert "confidence" not in invoice["exporter"]
+
+
+def test_draft_builder_reads_section_confidence(extracted):
+    shipment, scores = build_draft_shipment(
+        [{"id": "f1", "file_type": "invoice", "extracted_data": extracted}]
+    )
+    assert shipment["invoice_number"] == "WFS-042025-26"
+    assert shipment["shipper_address"]["city"] == "Jaipur"
+    assert scores["invoice_number"] == 0.95
+    assert scores["shipper_address"]["city"] == 0.9
+    assert scores["billing_address"]["name"] == 0.85
+    assert scores["_overall"] > 0
+
+
+def test_estimate_confidence_uses_extracted_scores(extracted):
+    # 4 header fields @ 0.95, 6 + 6 populated address fields @ 0.9 / 0.85,
+    # 9 populated line item fields @ 0.8; the 6 null fields score 0.0.
+    expected = (4 * 0.95 + 6 * 0.9 + 6 * 0.85 + 9 * 0.8) / 31
+    assert agent._estimate_confidence(extracted, "invoice") == pytest.approx(expected, abs=1e-3)
@@ -0,0 +1,29 @@
+"""Regex normalization of product descriptions (Gaia cache keys)."""
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("anthropic")
+
+from backend.services.description_normalizer import normalize_description  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    ("raw", "expected"),
+    [
+        # Quantities are stripped before prices, so the currency survives
+        ("USD 10 pcs copper bottle", "usd copper bottle"),
+        ("INR 10 kgs tea", "inr tea"),
+        # ...and before references, which then swallow the next token
+        ("Item: 5 pcs", "item"),
+        ("SKU:10 pcs mug", ""),
+        ("PO#4521 cotton kurti 20 pieces", "cotton kurti"),
+        ("Copper Bottle 1L x 500 PCS @ $12.50", "copper bottle 1l x"),
+        ("₹ 1,200 brass lamp 2 sets", "brass lamp"),
+        # Unicode whitespace and digits count (NBSP, Devanagari numerals)
+        ("10\u00a0pcs copper mug", "copper mug"),
+        ("१० pcs brass diya", "brass diya"),
+    ],
+)
+def test_normalize_description(raw, expected):
+    assert normalize_description(raw) == expected
@@ -0,0 +1,48 @@
+"""Extraction hint caching in the learning service."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("asyncpg")
+
+from backend import db  # noqa: E402
+from backend.services import learning  # noqa: E402
+
+
+@pytest.fixture
+def corrections(monkeypatch):
+    rows: list[dict] = []
+    calls = []
+
+    async def fake_get_corrections_for_fields(field_paths, limit_per=2, seller_id=None):
+        calls.append(field_paths)
+        return {"invoice_number": list(rows)}
+
+    monkeypatch.setattr(db, "get_corrections_for_fields", fake_get_corrections_for_fields)
+    learning.invalidate_hint_cache()
+    yield rows, calls
+    learning.invalidate_hint_cache()
+
+
+def test_hint_is_cached(corrections):
+    _, calls = corrections
+    asyncio.run(learning.build_extraction_hint(["invoice_number"]))
+    asyncio.run(learning.build_extraction_hint(["invoice_number"]))
+    assert len(calls) == 1
+
+
+def test_saved_correction_invalidates_hint(corrections):
+    rows, _ = corrections
+    assert asyncio.run(learning.build_extraction_hint(["invoice_number"])) == ""
+
+    rows.append({
+        "field_path": "invoice_number",
+        "original_value": '"INV-1"',
+        "corrected_value": '"INV-001"',
+    })
+    learning.invalidate_hint_cache()
+
+    hint = asyncio.run(learning.build_extraction_hint(["invoice_number"]))
+    assert "'INV-1' but correct was 'INV-001'" in hint
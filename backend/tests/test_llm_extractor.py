@@ -0,0 +1,39 @@
+"""Local helpers of the LLM extractor (no API calls)."""
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("anthropic")
+pytest.importorskip("pydantic")
+
+from backend.services.llm_extractor import _encode_table, _extract_json_from_response  # noqa: E402
+
+
+def test_repair_drops_trailing_commas():
+    raw = 'Here you go: {"a": [1, 2,], "b": {"c": 3,},}'
+    assert _extract_json_from_response(raw) == {"a": [1, 2], "b": {"c": 3}}
+
+
+def test_repair_keeps_commas_inside_strings():
+    raw = '{"items": [{"description": "bolts, ]"}, {"description": "a,}"},]}'
+    assert _extract_json_from_response(raw) == {
+        "items": [{"description": "bolts, ]"}, {"description": "a,}"}],
+    }
+
+
+def test_repair_handles_escaped_quotes():
+    raw = '{"description": "6\\" pipe, ]", "qty": 2,}'
+    assert _extract_json_from_response(raw) == {"description": '6" pipe, ]', "qty": 2}
+
+
+def test_encode_table_quotes_cells_with_delimiters():
+    table = [
+        ["Description", "Qty, pcs", None],
+        ['Copper "Moscow" mug|set', "10", None],
+        ["Steel\nbottle", "5", None],
+    ]
+    assert _encode_table(table, "p1.table1") == "\n".join([
+        'p1.table1[2]{Description,"Qty, pcs"}:',
+        '"Copper ""Moscow"" mug|set"|10',
+        "Steel bottle|5",
+    ])